@@ -31,6 +31,26 @@ app = create_app(Production(configfiles), configfiles, init_for_operation=False)
 # set up flask command processing (not needed within app_server.py)
 migrate = Migrate(app, db, compare_type=True)
 
+# worker for uploaded route files, run from crond
+from runningroutes.jobs import process_route_jobs_command
+app.cli.add_command(process_route_jobs_command)
+
+# one time conversion of csv path files
+from runningroutes.files import convert_path_files_command
+app.cli.add_command(convert_path_files_command)
+
+# reload location geocode cache, run from crond
+from runningroutes.locations import refresh_locations_command
+app.cli.add_command(refresh_locations_command)
+
+# check for full table scans in hot queries, after migrations
+from runningroutes.queryplans import check_query_plans_command
+app.cli.add_command(check_query_plans_command)
+
+# build asset bundles and their compressed variants
+from runningroutes.precompress import precompress_assets_command
+app.cli.add_command(precompress_assets_command)
+
 # Needed only if serving web pages
 # implement proxy fix (https://github.com/sjmf/reverse-proxy-minimal-example)
 from werkzeug.middleware.proxy_fix import ProxyFix
@@ -16,4 +16,7 @@ files=(/initdb.d/${APP_DATABASE}-*.sql)
 
 flask db upgrade
 
+# build asset bundles and their compressed variants, which are served by runningroutes.precompress
+flask precompress-assets
+
 exec "$@"
@@ -18,11 +18,12 @@ from flask_babel import Babel
 import loutilities
 from loutilities.configparser import getitems
 from loutilities.user import UserSecurity
-from loutilities.user.model import Interest, Application, User, Role
+from loutilities.user.model import Application, User, Role
 from loutilities.flask_helpers.mailer import sendmail
 
 # homegrown
 from .models import update_local_tables
+from .navcontext import navcontext, navcontextcache
 
 # define security globals
 user_datastore = None
@@ -120,6 +121,10 @@ def create_app(config_obj, configfiles=None, init_for_operation=True):
     asset_env.init_app(app)
     asset_env.register(asset_bundles)
 
+    # serve precompressed variants of static files
+    from .precompress import init_app as precompress_init_app
+    precompress_init_app(app)
+
     # Set up Flask-Mail [configuration in <application>.cfg] and security mailer
     mail = Mail(app)
 
@@ -179,25 +184,20 @@ def create_app(config_obj, configfiles=None, init_for_operation=True):
     # ----------------------------------------------------------------------
     @app.before_request
     def before_request():
-        g.loutility = Application.query.filter_by(application=app.config['APP_LOUTILITY']).one()
+        # cached, see navcontext.py
+        g.loutility = navcontextcache.loutility()
 
         if current_user.is_authenticated:
             user = current_user
             email = user.email
-
-            # used in layout.jinja2
-            app.jinja_env.globals['user_interests'] = sorted([{'interest': i.interest, 'description': i.description}
-                                                              for i in user.interests if g.loutility in i.applications],
-                                                             key=lambda a: a['description'].lower())
             session['user_email'] = email
 
         else:
-            # used in layout.jinja2
-            pubinterests = Interest.query.filter_by(public=True).all()
-            app.jinja_env.globals['user_interests'] = sorted([{'interest': i.interest, 'description': i.description}
-                                                              for i in pubinterests if g.loutility in i.applications],
-                                                             key=lambda a: a['description'].lower())
             session.pop('user_email', None)
+            session.pop('user_interests', None)
+
+    # user_interests used in layout.jinja2, only built when a template is rendered
+    app.context_processor(navcontext)
 
     # ----------------------------------------------------------------------
     @app.after_request
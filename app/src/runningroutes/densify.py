@@ -0,0 +1,213 @@
+###########################################################################################
+# densify - insert path points so no two points are farther apart than a max interval
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+densify - insert path points so no two points are farther apart than a max interval
+=========================================================================================
+
+Densifiers take the list of [lat, lng] points from a gpx/kml file and return the total
+distance (km), the densified list of points, and the annotation list used for the path file.
+The engine is selected by APP_DENSIFY_ENGINE ('numpy' by default, 'scalar' is the original
+point by point algorithm, kept for comparison)
+'''
+# standard
+from math import pi
+
+# pypi
+import numpy
+from loutilities.geo import calculateBearing
+
+class parameterError(Exception): pass
+
+########################################################################
+class Densifier():
+    '''
+    base class for densifier engines
+
+    :param geodist: loutilities.geo.GeoDistance instance
+    :param maxinterval: maximum distance between points, km
+    '''
+    # ----------------------------------------------------------------------
+    def __init__(self, geodist, maxinterval):
+        self.geodist = geodist
+        self.maxinterval = maxinterval
+
+    # ----------------------------------------------------------------------
+    def densify(self, locations):
+        '''
+        insert points between locations which are farther apart than self.maxinterval
+
+        :param locations: list of [lat, lng]
+        :return: distance, locs, anno
+            distance - total distance in km
+            locs - list of [lat, lng], including inserted points
+            anno - list of [cumdist, inserted] for each of locs, where inserted is '' or 'inserted'
+        '''
+        raise NotImplementedError
+
+########################################################################
+class ScalarDensifier(Densifier):
+    '''
+    original point by point densifier
+    '''
+    # ----------------------------------------------------------------------
+    def densify(self, locations):
+        distance = 0.0
+        locs = [locations[0]]
+        # anno is list of [cumdist, inserted], where inserted is empty or 'inserted'
+        anno = [[0, '']]
+        for i in range(1,len(locations)):
+            thisdist = self.geodist.haversineDistance(locations[i-1], locations[i], False)
+            eachdist = thisdist
+            # add additional points if the distance between these is longer than allowed
+            if thisdist > self.maxinterval:
+                numnew = int(thisdist / self.maxinterval)
+                eachdist = thisdist / (numnew+1)
+                bearing = calculateBearing(locations[i-1], locations[i])
+                lastcoord = locations[i-1]
+                for j in range(numnew):
+                    distance += eachdist
+                    anno.append([distance, 'inserted'])
+                    # getDestinationLatLng expects distance in meters
+                    newcoord = self.geodist.getDestinationLatLng(lastcoord, bearing, eachdist*1000)
+                    locs.append(newcoord)
+                    lastcoord = newcoord
+            distance += eachdist
+            anno.append([distance, ''])
+            locs.append(locations[i])
+
+        return distance, locs, anno
+
+########################################################################
+class NumpyDensifier(Densifier):
+    '''
+    array based densifier
+
+    distances and bearings are calculated for all segments at once. Inserted points are
+    calculated for all segments which need them at the same time, one step along each
+    segment per pass, so the number of passes is the maximum number of points inserted
+    into any single segment
+    '''
+    # ----------------------------------------------------------------------
+    def haversine(self, lat1, lng1, lat2, lng2):
+        '''
+        array version of GeoDistance.haversineDistance(), without elevation
+
+        :param lat1, lng1, lat2, lng2: arrays of points, radians
+        :return: array of distances, km
+        '''
+        a = (numpy.sin((lat2 - lat1) / 2) ** 2 +
+             numpy.cos(lat1) * numpy.cos(lat2) * numpy.sin((lng2 - lng1) / 2) ** 2)
+        c = 2 * numpy.arctan2(numpy.sqrt(a), numpy.sqrt(1 - a))
+        return self.geodist.R * c
+
+    # ----------------------------------------------------------------------
+    def bearing(self, lat1, lng1, lat2, lng2):
+        '''
+        array version of loutilities.geo.calculateBearing()
+
+        :param lat1, lng1, lat2, lng2: arrays of points, radians
+        :return: array of bearings, radians
+        '''
+        dlng = lng2 - lng1
+        dphi = numpy.log(numpy.tan(lat2/2.0 + pi/4.0) / numpy.tan(lat1/2.0 + pi/4.0))
+        dlng = numpy.where(dlng > pi, -(2.0*pi - dlng), dlng)
+        dlng = numpy.where(dlng < -pi, 2.0*pi + dlng, dlng)
+        return numpy.arctan2(dlng, dphi) % (2.0*pi)
+
+    # ----------------------------------------------------------------------
+    def destination(self, lat1, lng1, bearing, distance):
+        '''
+        array version of GeoDistance.getDestinationLatLng()
+
+        :param lat1, lng1: arrays of start points, degrees
+        :param bearing: array of bearings, radians
+        :param distance: array of distances, km
+        :return: lat2, lng2 arrays, degrees
+        '''
+        delta = distance / self.geodist.R
+        lat1 = numpy.radians(lat1)
+        lng1 = numpy.radians(lng1)
+        lat2 = numpy.arcsin(numpy.sin(lat1) * numpy.cos(delta) + numpy.cos(lat1) * numpy.sin(delta) * numpy.cos(bearing))
+        lng2 = lng1 + numpy.arctan2(numpy.sin(bearing) * numpy.sin(delta) * numpy.cos(lat1),
+                                    numpy.cos(delta) - numpy.sin(lat1) * numpy.sin(lat2))
+        return numpy.degrees(lat2), numpy.degrees(lng2)
+
+    # ----------------------------------------------------------------------
+    def densify(self, locations):
+        # ele may be present, but is not used
+        points = numpy.array([loc[:2] for loc in locations], dtype=float)
+        lat = points[:, 0]
+        lng = points[:, 1]
+        latr = numpy.radians(lat)
+        lngr = numpy.radians(lng)
+
+        # segment i is from point i to point i+1
+        segdist = self.haversine(latr[:-1], lngr[:-1], latr[1:], lngr[1:])
+        numnew = numpy.where(segdist > self.maxinterval, (segdist / self.maxinterval).astype(int), 0)
+        eachdist = segdist / (numnew + 1)
+        bearing = self.bearing(latr[:-1], lngr[:-1], latr[1:], lngr[1:])
+
+        # each segment contributes its inserted points followed by its end point
+        # segstart is the index into the output of the first point contributed by each segment
+        counts = numnew + 1
+        segstart = 1 + numpy.concatenate(([0], numpy.cumsum(counts)[:-1])).astype(int)
+        numout = 1 + int(counts.sum())
+
+        outlat = numpy.empty(numout)
+        outlng = numpy.empty(numout)
+        inserted = numpy.zeros(numout, dtype=bool)
+
+        outlat[0] = lat[0]
+        outlng[0] = lng[0]
+        outlat[segstart + numnew] = lat[1:]
+        outlng[segstart + numnew] = lng[1:]
+
+        # walk each segment which needs inserted points one step at a time
+        curlat = lat[:-1].copy()
+        curlng = lng[:-1].copy()
+        maxnew = int(numnew.max()) if len(numnew) else 0
+        for j in range(maxnew):
+            active = numpy.nonzero(numnew > j)[0]
+            curlat[active], curlng[active] = self.destination(curlat[active], curlng[active],
+                                                              bearing[active], eachdist[active])
+            outndx = segstart[active] + j
+            outlat[outndx] = curlat[active]
+            outlng[outndx] = curlng[active]
+            inserted[outndx] = True
+
+        # cumulative distance accumulates eachdist for every output point in the segment
+        stepdist = numpy.zeros(numout)
+        stepdist[1:] = numpy.repeat(eachdist, counts)
+        cumdist = numpy.cumsum(stepdist)
+
+        locs = numpy.column_stack((outlat, outlng)).tolist()
+        anno = [[d, 'inserted' if i else ''] for d, i in zip(cumdist.tolist(), inserted.tolist())]
+        anno[0][0] = 0
+
+        return float(cumdist[-1]), locs, anno
+
+densifiers = {
+    'scalar': ScalarDensifier,
+    'numpy': NumpyDensifier,
+}
+
+# ----------------------------------------------------------------------
+def get_densifier(engine, geodist, maxinterval):
+    '''
+    return densifier for the indicated engine
+
+    :param engine: key in densifiers
+    :param geodist: loutilities.geo.GeoDistance instance
+    :param maxinterval: maximum distance between points, km
+    :return: Densifier instance
+    '''
+    if engine not in densifiers:
+        raise parameterError('unknown densify engine {}, must be one of {}'.format(engine, list(densifiers)))
+    return densifiers[engine](geodist, maxinterval)
@@ -0,0 +1,427 @@
+###########################################################################################
+# elevation - elevation retrieval for route paths
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+elevation - elevation retrieval for route paths
+===================================================
+'''
+# standard
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from math import sqrt, cos, radians
+from os import makedirs
+from os.path import join, exists, getsize, dirname
+from sqlite3 import connect
+from threading import Lock
+from time import monotonic, sleep
+
+# pypi
+import numpy
+from googlemaps.elevation import elevation
+
+class ElevationError(Exception): pass
+
+########################################################################
+class ElevationProvider():
+    '''
+    base class for elevation providers
+    '''
+    # ----------------------------------------------------------------------
+    def elevations(self, locs):
+        '''
+        retrieve elevations for all locs
+
+        :param locs: list of [lat, lng]
+        :return: list of {'lat', 'lng', 'orig_ele', 'res'}, in the same order as locs
+        '''
+        raise NotImplementedError
+
+########################################################################
+class RateLimiter():
+    '''
+    thread safe limiter which spaces the start of queries to stay within queries_per_second
+
+    :param queries_per_second: maximum number of queries to start each second
+    '''
+    # ----------------------------------------------------------------------
+    def __init__(self, queries_per_second):
+        self.interval = 1.0 / queries_per_second
+        self.lock = Lock()
+        self.nextstart = monotonic()
+
+    # ----------------------------------------------------------------------
+    def wait(self):
+        '''
+        wait until the next query is allowed to start
+        '''
+        with self.lock:
+            now = monotonic()
+            starttime = max(now, self.nextstart)
+            self.nextstart = starttime + self.interval
+        if starttime > now:
+            sleep(starttime - now)
+
+########################################################################
+class ElevationFetcher(ElevationProvider):
+    '''
+    retrieve elevations from google elevation api, sending chunks of the path concurrently
+
+    the path is cut into chunks of maxsamples points, and the chunk requests are sent through
+    a bounded thread pool. Results are put back together in path order
+
+    :param client: googlemaps.client.Client instance
+    :param maxsamples: maximum number of points in a single request
+    :param maxworkers: maximum number of requests in flight at once
+    :param queries_per_second: maximum number of requests started each second
+    :param logger: optional logger
+    '''
+    # ----------------------------------------------------------------------
+    def __init__(self, client, maxsamples=512, maxworkers=4, queries_per_second=50, logger=None):
+        self.client = client
+        self.maxsamples = maxsamples
+        self.maxworkers = maxworkers
+        self.ratelimiter = RateLimiter(queries_per_second)
+        self.logger = logger
+
+    # ----------------------------------------------------------------------
+    def _fetchchunk(self, chunk):
+        '''
+        retrieve elevations for a single chunk
+
+        :param chunk: list of [lat, lng], no longer than self.maxsamples
+        :return: list of {'lat', 'lng', 'orig_ele', 'res'}
+        '''
+        self.ratelimiter.wait()
+        elev = elevation(self.client, chunk)
+        if len(elev) != len(chunk):
+            raise ElevationError('elevation(): expected {} points, received {}'.format(len(chunk), len(elev)))
+
+        # keys need to match Path fields
+        return [{'lat':p['location']['lat'], 'lng':p['location']['lng'], 'orig_ele':p['elevation'], 'res':p['resolution']} for p in elev]
+
+    # ----------------------------------------------------------------------
+    def fetch(self, locs):
+        '''
+        retrieve elevations for all locs
+
+        :param locs: list of [lat, lng]
+        :return: list of {'lat', 'lng', 'orig_ele', 'res'}, in the same order as locs
+        '''
+        chunks = [locs[i:i+self.maxsamples] for i in range(0, len(locs), self.maxsamples)]
+        if self.logger: self.logger.debug('ElevationFetcher.fetch() {} points in {} chunks'.format(len(locs), len(chunks)))
+
+        # no need for threads if there's only one request
+        if len(chunks) <= 1:
+            return [p for chunk in chunks for p in self._fetchchunk(chunk)]
+
+        # map() returns results in the order of chunks, raising the first exception encountered
+        with ThreadPoolExecutor(max_workers=min(self.maxworkers, len(chunks))) as executor:
+            results = executor.map(self._fetchchunk, chunks)
+            return [p for chunkresult in results for p in chunkresult]
+
+    # ----------------------------------------------------------------------
+    def elevations(self, locs):
+        return self.fetch(locs)
+
+########################################################################
+class DemElevationProvider(ElevationProvider):
+    '''
+    retrieve elevations from local SRTM digital elevation model tiles, using fallback provider
+    for points which aren't covered by a tile
+
+    tiles are SRTM .hgt files named for their southwest corner, e.g., N39W078.hgt, which are
+    square arrays of big-endian int16 elevations in meters, north row first. Both 1 arc-second
+    (3601x3601) and 3 arc-second (1201x1201) tiles are supported. Tiles are memory-mapped when
+    first used, and the most recently used maxtiles tiles are kept open
+
+    :param demfolder: folder containing .hgt tiles
+    :param fallback: ElevationProvider for points with no tile, or None
+    :param maxtiles: maximum number of tiles to keep memory-mapped
+    :param logger: optional logger
+    '''
+    VOID = -32768
+
+    # ----------------------------------------------------------------------
+    def __init__(self, demfolder, fallback=None, maxtiles=16, logger=None):
+        self.demfolder = demfolder
+        self.fallback = fallback
+        self.maxtiles = maxtiles
+        self.logger = logger
+        self.tiles = OrderedDict()
+        self.lock = Lock()
+
+    # ----------------------------------------------------------------------
+    def tilename(self, latfloor, lngfloor):
+        '''
+        return SRTM tile name for tile with southwest corner at latfloor, lngfloor
+        '''
+        return '{}{:02d}{}{:03d}.hgt'.format('N' if latfloor >= 0 else 'S', abs(latfloor),
+                                             'E' if lngfloor >= 0 else 'W', abs(lngfloor))
+
+    # ----------------------------------------------------------------------
+    def gettile(self, latfloor, lngfloor):
+        '''
+        return memory-mapped tile array for tile with southwest corner at latfloor, lngfloor
+
+        :return: numpy.memmap, or None if tile isn't available
+        '''
+        name = self.tilename(latfloor, lngfloor)
+        with self.lock:
+            if name in self.tiles:
+                self.tiles.move_to_end(name)
+                return self.tiles[name]
+
+            filepath = join(self.demfolder, name)
+            if not exists(filepath):
+                return None
+
+            size = int(sqrt(getsize(filepath) // 2))
+            if size * size * 2 != getsize(filepath):
+                if self.logger: self.logger.warning('DemElevationProvider: {} is not a square tile, ignored'.format(filepath))
+                return None
+
+            tile = numpy.memmap(filepath, dtype='>i2', mode='r', shape=(size, size))
+            self.tiles[name] = tile
+            if len(self.tiles) > self.maxtiles:
+                self.tiles.popitem(last=False)
+            return tile
+
+    # ----------------------------------------------------------------------
+    def interpolate(self, tile, latfloor, lngfloor, lat, lng):
+        '''
+        bilinear interpolation of elevations within a single tile
+
+        :param tile: tile array
+        :param latfloor, lngfloor: southwest corner of tile
+        :param lat, lng: arrays of points within the tile, degrees
+        :return: array of elevations, nan where tile has a void
+        '''
+        last = tile.shape[0] - 1
+        # row 0 is north edge of tile
+        row = (latfloor + 1 - lat) * last
+        col = (lng - lngfloor) * last
+        r0 = numpy.clip(numpy.floor(row).astype(int), 0, last - 1)
+        c0 = numpy.clip(numpy.floor(col).astype(int), 0, last - 1)
+        dr = row - r0
+        dc = col - c0
+
+        corners = [tile[r0, c0], tile[r0, c0+1], tile[r0+1, c0], tile[r0+1, c0+1]]
+        void = numpy.zeros(len(lat), dtype=bool)
+        for corner in corners:
+            void |= corner == self.VOID
+        v00, v01, v10, v11 = [corner.astype(float) for corner in corners]
+
+        ele = (v00 * (1 - dr) * (1 - dc) + v01 * (1 - dr) * dc +
+               v10 * dr * (1 - dc) + v11 * dr * dc)
+        ele[void] = numpy.nan
+        return ele
+
+    # ----------------------------------------------------------------------
+    def elevations(self, locs):
+        if not locs:
+            return []
+
+        points = numpy.array([loc[:2] for loc in locs], dtype=float)
+        lat = points[:, 0]
+        lng = points[:, 1]
+        latfloor = numpy.floor(lat).astype(int)
+        lngfloor = numpy.floor(lng).astype(int)
+
+        ele = numpy.full(len(locs), numpy.nan)
+        res = numpy.full(len(locs), numpy.nan)
+        for tilelat, tilelng in set(zip(latfloor.tolist(), lngfloor.tolist())):
+            tile = self.gettile(tilelat, tilelng)
+            if tile is None:
+                continue
+            intile = (latfloor == tilelat) & (lngfloor == tilelng)
+            ele[intile] = self.interpolate(tile, tilelat, tilelng, lat[intile], lng[intile])
+            # meters between samples in lat direction
+            res[intile] = 111320.0 / (tile.shape[0] - 1)
+
+        results = [{'lat': lat_, 'lng': lng_, 'orig_ele': ele_, 'res': res_}
+                   for lat_, lng_, ele_, res_ in zip(lat.tolist(), lng.tolist(), ele.tolist(), res.tolist())]
+
+        # get anything which wasn't covered from the fallback provider
+        missing = numpy.nonzero(numpy.isnan(ele))[0].tolist()
+        if missing:
+            if not self.fallback:
+                raise ElevationError('DemElevationProvider: {} points not covered by tiles and no fallback'.format(len(missing)))
+            if self.logger: self.logger.debug('DemElevationProvider: {} of {} points from fallback'.format(len(missing), len(locs)))
+            fallbackresults = self.fallback.elevations([locs[i] for i in missing])
+            for i, result in zip(missing, fallbackresults):
+                results[i] = result
+
+        return results
+
+########################################################################
+class CachedElevationProvider(ElevationProvider):
+    '''
+    persistent point elevation cache in front of another provider
+
+    points are keyed by lat, lng quantized to a grid of resolution meters, stored in a sqlite
+    file. Only points which miss the cache are sent to the provider, one point per grid cell.
+    Hit and miss counts are kept in the cache file
+
+    grid cells are resolution meters on a side at any latitude, i.e., the lng quantum is scaled by
+    cos(lat) of the cell's row, so a cached elevation is within resolution/sqrt(2) meters of the
+    requested point. The cache file is opened when elevations are first requested
+
+    :param provider: ElevationProvider to use for cache misses
+    :param cachefile: path of sqlite file, created if not present
+    :param resolution: grid size, meters
+    :param logger: optional logger
+    '''
+    # sqlite limits the number of variables in a statement
+    MAX_KEYS_PER_QUERY = 400
+
+    # keeps lng quantum finite near the poles
+    MIN_COSLAT = 0.01
+
+    # ----------------------------------------------------------------------
+    def __init__(self, provider, cachefile, resolution=9.5, logger=None):
+        self.provider = provider
+        self.cachefile = cachefile
+        # degrees of latitude per grid cell
+        self.quantum = resolution / 111320.0
+        self.logger = logger
+        self.initialized = False
+        self.initlock = Lock()
+
+    # ----------------------------------------------------------------------
+    def _initdb(self):
+        '''
+        create cache file and tables if not present
+        '''
+        if dirname(self.cachefile):
+            makedirs(dirname(self.cachefile), exist_ok=True)
+        conn = connect(self.cachefile, timeout=30)
+        try:
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS cellelevation '
+                             '(latq INTEGER, lngq INTEGER, ele REAL, res REAL, PRIMARY KEY (latq, lngq)) WITHOUT ROWID')
+                conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)')
+                conn.executemany('INSERT OR IGNORE INTO stats (name, value) VALUES (?, 0)', [('hits',), ('misses',)])
+        finally:
+            conn.close()
+
+    # ----------------------------------------------------------------------
+    @contextmanager
+    def _connect(self):
+        '''
+        connection to cache file, committed and closed when done
+        '''
+        with self.initlock:
+            if not self.initialized:
+                self._initdb()
+                self.initialized = True
+
+        # gunicorn workers share the file, so wait for other writers rather than failing
+        conn = connect(self.cachefile, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ----------------------------------------------------------------------
+    def key(self, loc):
+        '''
+        return cache key for loc
+
+        :param loc: [lat, lng]
+        :return: (latq, lngq)
+        '''
+        latq = int(round(loc[0] / self.quantum))
+        lngquantum = self.quantum / max(cos(radians(latq * self.quantum)), self.MIN_COSLAT)
+        return (latq, int(round(loc[1] / lngquantum)))
+
+    # ----------------------------------------------------------------------
+    def stats(self):
+        '''
+        return cache statistics
+
+        :return: {'hits': hits, 'misses': misses, 'points': number of cached points}
+        '''
+        with self._connect() as conn:
+            stats = dict(conn.execute('SELECT name, value FROM stats').fetchall())
+            stats['points'] = conn.execute('SELECT COUNT(*) FROM cellelevation').fetchone()[0]
+        return stats
+
+    # ----------------------------------------------------------------------
+    def elevations(self, locs):
+        if not locs:
+            return []
+
+        keys = [self.key(loc) for loc in locs]
+        uniquekeys = list(set(keys))
+
+        # look up everything which is cached
+        cached = {}
+        with self._connect() as conn:
+            for i in range(0, len(uniquekeys), self.MAX_KEYS_PER_QUERY):
+                theskeys = uniquekeys[i:i+self.MAX_KEYS_PER_QUERY]
+                query = 'SELECT latq, lngq, ele, res FROM cellelevation WHERE (latq, lngq) IN (VALUES {})'.format(
+                    ','.join(['(?,?)'] * len(theskeys)))
+                params = [v for key in theskeys for v in key]
+                for latq, lngq, ele, res in conn.execute(query, params):
+                    cached[(latq, lngq)] = (ele, res)
+
+        # one representative point for each grid cell which missed
+        missedlocs = {}
+        for key, loc in zip(keys, locs):
+            if key not in cached and key not in missedlocs:
+                missedlocs[key] = loc
+
+        if missedlocs:
+            misskeys = list(missedlocs)
+            fetched = self.provider.elevations([missedlocs[key] for key in misskeys])
+            newrows = []
+            for key, p in zip(misskeys, fetched):
+                cached[key] = (p['orig_ele'], p['res'])
+                newrows.append(key + cached[key])
+        else:
+            newrows = []
+
+        hits = sum(1 for key in keys if key not in missedlocs)
+        misses = len(locs) - hits
+        with self._connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO cellelevation (latq, lngq, ele, res) VALUES (?, ?, ?, ?)', newrows)
+            conn.execute("UPDATE stats SET value = value + ? WHERE name = 'hits'", (hits,))
+            conn.execute("UPDATE stats SET value = value + ? WHERE name = 'misses'", (misses,))
+        if self.logger: self.logger.debug('CachedElevationProvider: {} hits, {} misses, {} points fetched'.format(
+            hits, misses, len(newrows)))
+
+        return [{'lat': loc[0], 'lng': loc[1], 'orig_ele': cached[key][0], 'res': cached[key][1]}
+                for key, loc in zip(keys, locs)]
+
+# ----------------------------------------------------------------------
+def get_elevation_provider(provider, googleprovider, demfolder=None, cachefile=None, cacheresolution=9.5, logger=None):
+    '''
+    return elevation provider
+
+    :param provider: 'google' or 'dem'
+    :param googleprovider: google ElevationProvider, used directly or as fallback for 'dem'
+    :param demfolder: folder containing .hgt tiles, required for 'dem'
+    :param cachefile: sqlite file for point elevation cache, or None for no cache
+    :param cacheresolution: point elevation cache grid size, meters
+    :param logger: optional logger
+    :return: ElevationProvider instance
+    '''
+    if provider == 'google':
+        thisprovider = googleprovider
+    elif provider == 'dem':
+        thisprovider = DemElevationProvider(demfolder, fallback=googleprovider, logger=logger)
+    else:
+        raise ElevationError('unknown elevation provider {}, must be one of google, dem'.format(provider))
+
+    if cachefile:
+        thisprovider = CachedElevationProvider(thisprovider, cachefile, resolution=cacheresolution, logger=logger)
+
+    return thisprovider
@@ -10,16 +10,56 @@
 
 # standard
 from os.path import join, exists
-from os import mkdir
+from os import mkdir, replace, fstat
+from mmap import mmap, ACCESS_READ
 from uuid import uuid4
+from unicodedata import normalize
+from urllib.parse import quote
 
 # pypi
-from flask import current_app
+import click
+from flask import current_app, send_file
+from werkzeug.http import dump_options_header
 from loutilities.user.model import Interest
 
 # homegrown
-from .models import db, Files
-from .helpers import local2common_interest, common2local_interest
+from .models import db, Files, Route
+from .helpers import local2common_interest, common2local_interest, get_interest
+from .pathfile import csv2pathfile, read_pathfile, write_pathfile, pathfile_version
+from .pathfile import PATHFILE_EXT, PATHFILE_MIMETYPE, PATHFILE_VERSION
+
+# default chunk size for iter_fidfile()
+FIDFILE_CHUNKSIZE = 64 * 1024
+
+# ----------------------------------------------------------------------
+def fidfile_query(fid):
+    '''
+    query for file by file id
+
+    :param fid: file id
+    :return: Query
+    '''
+    return Files.query.filter_by(fileid=fid)
+
+# ----------------------------------------------------------------------
+def route_files_query(route_id):
+    '''
+    query for files which point at route
+
+    :param route_id: Route id
+    :return: Query
+    '''
+    return Files.query.filter_by(route_id=route_id)
+
+# ----------------------------------------------------------------------
+def gpxfile_routes_query(gpx_file_id):
+    '''
+    query for routes which use gpx file
+
+    :param gpx_file_id: file id of gpx file
+    :return: Query
+    '''
+    return Route.query.filter_by(gpx_file_id=gpx_file_id)
 
 # ----------------------------------------------------------------------
 def create_fidfile(group, filename, mimetype, fid=None):
@@ -54,7 +94,7 @@ def create_fidfile(group, filename, mimetype, fid=None):
         fid = uuid4().hex
     filepath = join(groupfolder, fid)
     # TODO: how can the next two lines be made generic?
-    linterest = common2local_interest(Interest.query.filter_by(interest=group).one())
+    linterest = common2local_interest(get_interest(group))
     file = Files(fileid=fid, filename=filename, interest=linterest, mimetype=mimetype)
     db.session.add(file)
     db.session.commit()  # file is fully stored in the database now
@@ -63,15 +103,159 @@ def create_fidfile(group, filename, mimetype, fid=None):
     return fid, filepath
 
 # ----------------------------------------------------------------------
-def get_fidfile(fid):
-    file = Files.query.filter_by(fileid=fid).one()
+def get_fidfilepath(fid):
+    '''
+    determine pathname for file
+
+    :param fid: file id
+    :return: filepath
+    '''
+    file = fidfile_query(fid).one()
     mainfolder = current_app.config['APP_FILE_FOLDER']
     # TODO: how can the next line be made generic?
     groupfolder = join(mainfolder, local2common_interest(file.interest).interest)
-    filepath = join(groupfolder, fid)
+    return join(groupfolder, fid)
+
+# ----------------------------------------------------------------------
+def send_fidfile(fid, as_attachment=False, download_name=None):
+    '''
+    send file to client
+
+    if APP_FILE_ACCEL_PREFIX is configured, e.g., '/_files/', the response is empty and has an
+    X-Accel-Redirect header, so nginx sends the file from its internal location at that prefix, which
+    is mapped onto APP_FILE_FOLDER. Otherwise the file is sent by the app. The caller must check
+    permission before calling this
+
+    :param fid: file id
+    :param as_attachment: True to have the client save the file
+    :param download_name: name for client to save file as, default is the uploaded filename
+    :return: response
+    '''
+    file = fidfile_query(fid).one()
+    group = local2common_interest(file.interest).interest
+    if not download_name:
+        download_name = file.filename
+
+    accelprefix = current_app.config.get('APP_FILE_ACCEL_PREFIX', None)
+    if not accelprefix:
+        filepath = join(current_app.config['APP_FILE_FOLDER'], group, fid)
+        return send_file(filepath, mimetype=file.mimetype, as_attachment=as_attachment, download_name=download_name)
+
+    response = current_app.response_class(mimetype=file.mimetype)
+    response.headers['X-Accel-Redirect'] = quote('{}{}/{}'.format(accelprefix, group, fid))
+    # same Content-Disposition as send_file(), which allows non-ascii filenames
+    try:
+        download_name.encode('ascii')
+        options = {'filename': download_name}
+    except UnicodeEncodeError:
+        options = {'filename': normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii'),
+                   'filename*': "UTF-8''{}".format(quote(download_name, safe="!#$&+^`|~"))}
+    response.headers['Content-Disposition'] = dump_options_header('attachment' if as_attachment else 'inline', options)
+    return response
+
+# ----------------------------------------------------------------------
+def get_fidfile(fid):
+    file = fidfile_query(fid).one()
+    filepath = get_fidfilepath(fid)
 
     # this assumes text file
     with open(filepath, 'r') as f:
         contents = f.readlines()
 
-    return {'group':local2common_interest(file.interest), 'contents':contents}
\ No newline at end of file
+    return {'group':local2common_interest(file.interest), 'contents':contents}
+
+# ----------------------------------------------------------------------
+def get_fidfile_mmap(fid):
+    '''
+    get read-only access to file contents without copying the file into python objects
+
+    the returned contents support the buffer protocol, so they can be passed directly to
+    numpy.frombuffer(), xml parsers, etc. The mapping is released when the contents are
+    no longer referenced
+
+    :param fid: file id
+    :return: {'group': Interest, 'contents': read-only mmap of file, or b'' if file is empty}
+    '''
+    file = fidfile_query(fid).one()
+    filepath = get_fidfilepath(fid)
+
+    with open(filepath, 'rb') as f:
+        # mmap can't map an empty file
+        if fstat(f.fileno()).st_size == 0:
+            contents = b''
+        else:
+            contents = mmap(f.fileno(), 0, access=ACCESS_READ)
+
+    return {'group':local2common_interest(file.interest), 'contents':contents}
+
+# ----------------------------------------------------------------------
+def iter_fidfile(fid, chunksize=FIDFILE_CHUNKSIZE):
+    '''
+    stream file contents
+
+    :param fid: file id
+    :param chunksize: number of bytes in each chunk, or None to iterate by line
+    :return: generator of bytes
+    '''
+    filepath = get_fidfilepath(fid)
+
+    with open(filepath, 'rb') as f:
+        if chunksize is None:
+            yield from f
+        else:
+            yield from iter(lambda: f.read(chunksize), b'')
+
+# ----------------------------------------------------------------------
+def convert_pathfiles():
+    '''
+    convert route csv path files, and binary path files with an older format version, to the
+    current binary path file format, see pathfile.py
+
+    file ids are not changed, so routes continue to reference the same path file
+
+    :return: number of files converted
+    '''
+    numfiles = 0
+    pathfids = [r.path_file_id for r in Route.query.filter(Route.path_file_id != None).all()]
+    for fid in pathfids:
+        file = fidfile_query(fid).one_or_none()
+        if not file or file.mimetype not in ['text/csv', PATHFILE_MIMETYPE]:
+            continue
+
+        filepath = get_fidfilepath(fid)
+        if not exists(filepath):
+            current_app.logger.warning('convert_pathfiles(): missing file {} for {}'.format(filepath, file.filename))
+            continue
+
+        # older binary path file, rewrite with current format
+        if file.mimetype == PATHFILE_MIMETYPE:
+            with open(filepath, mode='rb') as pathfile:
+                contents = pathfile.read()
+            if pathfile_version(contents) == PATHFILE_VERSION:
+                continue
+            tmppath = filepath + '.tmp'
+            write_pathfile(tmppath, **read_pathfile(contents))
+            replace(tmppath, filepath)
+            numfiles += 1
+            continue
+
+        # write to temporary file so a failure doesn't lose the csv file
+        tmppath = filepath + '.tmp'
+        with open(filepath, mode='r', newline='') as csvfile:
+            csv2pathfile(csvfile, tmppath)
+        replace(tmppath, filepath)
+
+        if file.filename.endswith('.csv'):
+            file.filename = file.filename[:-len('.csv')]
+        file.filename += PATHFILE_EXT
+        file.mimetype = PATHFILE_MIMETYPE
+        db.session.commit()
+        numfiles += 1
+
+    return numfiles
+
+@click.command('convert-path-files')
+def convert_path_files_command():
+    '''convert route csv and older binary path files to current binary path file format'''
+    numfiles = convert_pathfiles()
+    click.echo('converted {} path files'.format(numfiles))
@@ -13,14 +13,24 @@ geo - geo functions, classes
 =================================
 '''
 # standard
+from bisect import bisect_left
+from collections import OrderedDict
+from csv import DictReader
 from datetime import datetime, timedelta
 from re import match
+from threading import Lock
+from time import sleep
 
 # pypi
+from flask import current_app
 from googlemaps.client import Client
+from sqlalchemy import select, insert, delete
+from sqlalchemy.exc import IntegrityError
 
 # homegrown
-from .models import db, Location
+from .models import db, Location, GeocodeResult
+
+class GeocodeError(Exception): pass
 
 # ----------------------------------------------------------------------
 def isLatlng(latlng):
@@ -36,20 +46,257 @@ def isLatlng(latlng):
     else:
         return False
 
+# ----------------------------------------------------------------------
+def geocoderesult_select(key):
+    '''
+    select geocode result for normalized address
+
+    :param key: normalized address, see normalize_address()
+    :return: Select
+    '''
+    table = GeocodeResult.__table__
+    return select(table.c.found, table.c.lat, table.c.lng, table.c.cached).where(table.c.address == key)
+
+# ----------------------------------------------------------------------
+def normalize_address(address):
+    '''
+    normalize address text for geocode cache key
+
+    :param address: address text
+    :return: lower case address with whitespace collapsed
+    '''
+    return ' '.join(address.lower().split())
+
+########################################################################
+class GeocodeCache():
+    '''
+    two tier geocode result cache, keyed by normalized address
+
+    results are kept in a bounded in-process LRU, backed by the GeocodeResult table which is
+    shared by all processes. Database reads and writes use their own connection so they are
+    independent of the caller's session transaction
+
+    results which weren't found are cached for a shorter time, in case the address was mistyped
+
+    :param maxsize: maximum number of entries in memory
+    :param notfound_limit: number of days to cache results which weren't found
+    :param persistent: False to keep results in memory only, without using the GeocodeResult table
+    '''
+    # ----------------------------------------------------------------------
+    def __init__(self, maxsize=1024, notfound_limit=1, persistent=True):
+        self.maxsize = maxsize
+        self.notfound_limit = notfound_limit
+        self.persistent = persistent
+        self.memory = OrderedDict()
+        self.lock = Lock()
+
+    # ----------------------------------------------------------------------
+    def _fresh(self, entry, cache_limit):
+        limit = cache_limit if entry['found'] else min(cache_limit, self.notfound_limit)
+        return datetime.now() - entry['cached'] <= timedelta(limit)
+
+    # ----------------------------------------------------------------------
+    def get(self, address, cache_limit):
+        '''
+        get cached geocode result
+
+        :param address: address text
+        :param cache_limit: maximum age of result, days
+        :return: {'found', 'lat', 'lng', 'cached'} or None if not cached or too old
+        '''
+        key = normalize_address(address)
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry:
+                self.memory.move_to_end(key)
+        if entry and self._fresh(entry, cache_limit):
+            return entry
+        if not self.persistent:
+            return None
+
+        with db.engine.connect() as conn:
+            row = conn.execute(geocoderesult_select(key)).first()
+        if not row:
+            return None
+        entry = {'found': row.found, 'lat': row.lat, 'lng': row.lng, 'cached': row.cached}
+        self._remember(key, entry)
+        return entry if self._fresh(entry, cache_limit) else None
+
+    # ----------------------------------------------------------------------
+    def put(self, address, entry):
+        '''
+        save geocode result
+
+        :param address: address text
+        :param entry: {'found', 'lat', 'lng', 'cached'}
+        '''
+        key = normalize_address(address)
+        self._remember(key, entry)
+        if not self.persistent:
+            return
+
+        table = GeocodeResult.__table__
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(delete(table).where(table.c.address == key))
+                conn.execute(insert(table).values(address=key, **entry))
+        # another process saved the same address at the same time
+        except IntegrityError:
+            pass
+
+    # ----------------------------------------------------------------------
+    def _remember(self, key, entry):
+        with self.lock:
+            self.memory[key] = entry
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.maxsize:
+                self.memory.popitem(last=False)
+
+# shared by all GmapsLoc instances in this process which use google maps
+geocodecache = GeocodeCache()
+
+# memory only caches for other geocoders, {geocoder: GeocodeCache}, see GmapsLoc
+geocodercaches = {}
+geocodercaches_lock = Lock()
+
+########################################################################
+class GazetteerGeocoder():
+    '''
+    offline stand-in for googlemaps.client.Client geocoding, for testing without network access
+
+    the gazetteer is a csv file with columns name, lat, lng. Addresses are matched against name after
+    normalization; if there is no exact match, the shortest name which starts with the address is
+    used, e.g., 'frederick' matches 'frederick, md'
+
+    :param gazetteerfile: path to gazetteer csv file
+    :param latency: seconds to delay each lookup, to simulate network latency
+    '''
+    # ----------------------------------------------------------------------
+    def __init__(self, gazetteerfile, latency=0):
+        self.latency = latency
+        self.places = {}
+        with open(gazetteerfile, newline='') as f:
+            for row in DictReader(f):
+                self.places[normalize_address(row['name'])] = {
+                    'formatted_address': row['name'],
+                    'geometry': {'location': {'lat': float(row['lat']), 'lng': float(row['lng'])}},
+                }
+        self.names = sorted(self.places)
+
+    # ----------------------------------------------------------------------
+    def geocode(self, address):
+        '''
+        look up address
+
+        :param address: address text
+        :return: list of results in googlemaps.client.Client.geocode() format, empty if not found
+        '''
+        if self.latency:
+            sleep(self.latency)
+
+        key = normalize_address(address)
+        if key in self.places:
+            return [self.places[key]]
+
+        # fuzzy prefix lookup
+        matches = []
+        for name in self.names[bisect_left(self.names, key):]:
+            if not name.startswith(key):
+                break
+            matches.append(name)
+        if not matches:
+            return []
+        return [self.places[min(matches, key=len)]]
+
+# gazetteers are loaded once per process
+gazetteers = {}
+
+# ----------------------------------------------------------------------
+def get_geocoder(config):
+    '''
+    get geocoder backend selected by configuration
+
+    APP_GEOCODER is 'google' (default) or 'gazetteer'; for 'gazetteer' APP_GAZETTEER_FILE is
+    the gazetteer csv file and APP_GEOCODER_LATENCY optionally sets latency in seconds
+
+    :param config: app.config
+    :return: geocoder for GmapsLoc, None for google
+    '''
+    geocoder = config.get('APP_GEOCODER', 'google')
+    if geocoder == 'google':
+        return None
+    if geocoder == 'gazetteer':
+        gazetteerfile = config['APP_GAZETTEER_FILE']
+        latency = config.get('APP_GEOCODER_LATENCY', 0)
+        if (gazetteerfile, latency) not in gazetteers:
+            gazetteers[gazetteerfile, latency] = GazetteerGeocoder(gazetteerfile, latency=latency)
+        return gazetteers[gazetteerfile, latency]
+    raise GeocodeError('unknown APP_GEOCODER {}, must be google or gazetteer'.format(geocoder))
+
 ########################################################################
 class GmapsLoc():
     # ----------------------------------------------------------------------
-    def __init__(self, api_key, logger=None):
+    def __init__(self, api_key, logger=None, queries_per_second=50, cache=geocodecache, cache_limit=None, geocoder=None):
         '''
         location management
 
         :param api_key: google maps api key
+        :param queries_per_second: maximum rate of google maps api requests
+        :param cache: GeocodeCache instance, or None to disable caching; default is the persistent cache
+            for google maps, or a memory only cache for other geocoders
+        :param cache_limit: number of days geocode results are cached for loc2latlng and check_location,
+            default is app.config['GMAPS_CACHE_LIMIT']
+        :param geocoder: geocoder with googlemaps.client.Client.geocode() interface, see get_geocoder(),
+            default is google maps
         '''
         # see https://developers.google.com/maps/documentation/elevation/usage-limits
         # used for google maps geocoding
-        self.gmapsclient = Client(key=api_key, queries_per_second=50)
+        if geocoder:
+            self.gmapsclient = geocoder
+            # results from other geocoders, e.g., the gazetteer for load testing, must not be mixed
+            # with google results, so each geocoder has its own cache which is never saved
+            if cache is geocodecache:
+                with geocodercaches_lock:
+                    cache = geocodercaches.setdefault(geocoder, GeocodeCache(persistent=False))
+        else:
+            self.gmapsclient = Client(key=api_key, queries_per_second=queries_per_second)
 
         self.logger = logger
+        self.cache = cache
+        self.cache_limit = cache_limit
+
+    # ----------------------------------------------------------------------
+    def geocode(self, address, cache_limit=None):
+        '''
+        geocode address, using the cache if possible
+
+        :param address: address text
+        :param cache_limit: maximum age of cached result, days, default self.cache_limit
+        :return: {'found', 'lat', 'lng', 'cached'} where cached is the time of the google maps lookup
+        '''
+        if cache_limit is None:
+            cache_limit = self.cache_limit
+        # read when used, so GmapsLoc instances can be created before the app is configured
+        if cache_limit is None:
+            cache_limit = current_app.config['GMAPS_CACHE_LIMIT']
+
+        entry = self.cache.get(address, cache_limit) if self.cache else None
+        if entry:
+            return entry
+
+        # assume first location is best
+        geolocs = self.gmapsclient.geocode(address)
+        if geolocs:
+            entry = {'found': True,
+                     'lat': float(geolocs[0]['geometry']['location']['lat']),
+                     'lng': float(geolocs[0]['geometry']['location']['lng']),
+                     'cached': datetime.now()}
+        else:
+            entry = {'found': False, 'lat': None, 'lng': None, 'cached': datetime.now()}
+
+        if self.cache:
+            self.cache.put(address, entry)
+        return entry
 
     # ----------------------------------------------------------------------
     def loc2latlng(self, loc):
@@ -69,11 +316,10 @@ class GmapsLoc():
         ## get lat, lng from google maps API
         except ValueError:
             if self.logger: self.logger.debug('snaploc() looking up loc = {}'.format(loc))
-            # assume first location is best
-            geoloc = self.gmapsclient.geocode(loc)[0]
-            lat = float(geoloc['geometry']['location']['lat'])
-            lng = float(geoloc['geometry']['location']['lng'])
-            latlng = [lat, lng]
+            geoloc = self.geocode(loc)
+            if not geoloc['found']:
+                raise GeocodeError('location not found: {}'.format(loc))
+            latlng = [geoloc['lat'], geoloc['lng']]
 
         return latlng
 
@@ -121,27 +367,32 @@ class GmapsLoc():
         now = datetime.now()
 
         # if we need to reload the cache, do it
+        # cached is the time of the google maps lookup, which may have been for another location with the same address
         if not thisloc.cached or (now - thisloc.cached) > timedelta(cache_limit):
-            thisloc.cached = now
-            geoloc = self.gmapsclient.geocode(location)[0]
-            lat = float(geoloc['geometry']['location']['lat'])
-            lng = float(geoloc['geometry']['location']['lng'])
-            thisloc.lat = lat
-            thisloc.lng = lng
+            geoloc = self.geocode(location, cache_limit)
+            if not geoloc['found']:
+                raise GeocodeError('location not found: {}'.format(location))
+            thisloc.cached = geoloc['cached']
+            thisloc.lat = geoloc['lat']
+            thisloc.lng = geoloc['lng']
 
         # save everything and return the data
         db.session.commit()
         return {'id': thisloc.id, 'coordinates': [thisloc.lat, thisloc.lng]}
 
+    # ----------------------------------------------------------------------
+    def read_location(self, thisloc):
+        '''
+        get lat, lng for location without updating the database, see locations.refresh_locations()
+        for reloading the cache
+
+        :param thisloc: Location instance
+        :return: {'id': thisloc.id, 'coordinates': [thisloc.lat, thisloc.lng]}
+        '''
+        return {'id': thisloc.id, 'coordinates': [thisloc.lat, thisloc.lng]}
+
     def check_location(self, location):
         try:
-            geoloc = self.gmapsclient.geocode(location)
-            if len(geoloc) > 0:
-                return True
-            else:
-                return False
+            return self.geocode(location)['found']
         except:
             return False
-
-
-
@@ -2,13 +2,115 @@
 helpers - commonly needed utilities
 ====================================================================================
 '''
+# standard
+from threading import Lock
+from time import monotonic
 
 # pypi
-from flask import g
+from flask import g, current_app
 from loutilities.user.model import Interest
+from sqlalchemy.orm import make_transient_to_detached
 
 # homegrown
-from .models import LocalInterest
+from .models import db, LocalInterest
+
+class InterestRegistry():
+    """process level mapping between Interest slug, Interest id and LocalInterest id
+
+    Interests and LocalInterests hardly ever change, so they are all loaded together, and handed
+    out by merging detached copies into the current session, which doesn't query the database.
+    The registry is invalidated by update_local_tables(), reloaded if something isn't found
+    (e.g., another process added an interest) but at most once every APP_INTEREST_REGISTRY_MISSAGE
+    seconds (default 5), so requests for bogus interests don't reload it every time, and otherwise
+    reloaded after APP_INTEREST_REGISTRY_MAXAGE seconds (default 300)
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.invalidate()
+
+    def invalidate(self):
+        """forget everything, so the next lookup reloads the registry
+        """
+        with self.lock:
+            self.loaded = None
+            self.slugs = {}
+            self.interests = {}
+            self.linterests = {}
+            self.local2common = {}
+
+    def _load(self):
+        # query columns rather than instances, so instances in the current session aren't touched
+        interests = {}
+        slugs = {}
+        for id, slug, description, public, version_id in db.session.query(
+                Interest.id, Interest.interest, Interest.description, Interest.public, Interest.version_id).all():
+            interest = Interest(id=id, interest=slug, description=description, public=public, version_id=version_id)
+            make_transient_to_detached(interest)
+            interests[id] = interest
+            slugs[slug] = id
+
+        linterests = {}
+        local2common = {}
+        for id, interest_id, version_id in db.session.query(
+                LocalInterest.id, LocalInterest.interest_id, LocalInterest.version_id).all():
+            linterest = LocalInterest(id=id, interest_id=interest_id, version_id=version_id)
+            make_transient_to_detached(linterest)
+            linterests[interest_id] = linterest
+            local2common[id] = interest_id
+
+        with self.lock:
+            self.slugs, self.interests, self.linterests, self.local2common = slugs, interests, linterests, local2common
+            self.loaded = monotonic()
+
+    def _lookup(self, mapping, key):
+        maxage = current_app.config.get('APP_INTEREST_REGISTRY_MAXAGE', 300)
+        missage = current_app.config.get('APP_INTEREST_REGISTRY_MISSAGE', 5)
+        if self.loaded is None or monotonic() - self.loaded > maxage:
+            self._load()
+        # not found, maybe another process added it
+        elif key is not None and key not in getattr(self, mapping) and monotonic() - self.loaded > missage:
+            self._load()
+        return getattr(self, mapping).get(key)
+
+    def _attach(self, instance):
+        # merge without load doesn't query the database
+        return db.session.merge(instance, load=False) if instance is not None else None
+
+    def interest(self, slug):
+        """return Interest for slug, or None if not found
+        """
+        if slug is None:
+            return None
+        interest_id = self._lookup('slugs', slug)
+        return self._attach(self.interests.get(interest_id))
+
+    def interest_by_id(self, interest_id):
+        """return Interest for Interest.id, or None if not found
+        """
+        return self._attach(self._lookup('interests', interest_id))
+
+    def localinterest(self, interest_id):
+        """return LocalInterest for Interest.id, or None if not found
+        """
+        return self._attach(self._lookup('linterests', interest_id))
+
+    def localinterest_id2interest_id(self, linterest_id):
+        """return Interest.id for LocalInterest.id, or None if not found
+        """
+        return self._lookup('local2common', linterest_id)
+
+interestregistry = InterestRegistry()
+
+def get_interest(slug):
+    """return Interest for slug
+
+    Args:
+        slug (str): Interest.interest
+
+    Returns:
+        Interest: Interest instance, or None if not found
+    """
+    return interestregistry.interest(slug)
 
 def local2common_interest(linterest):
     """return Interest for a LocalInterest
@@ -19,7 +121,18 @@ def local2common_interest(linterest):
     Returns:
         Interest: Interest instance
     """
-    return Interest.query.filter_by(id=linterest.interest_id).one()
+    return interestregistry.interest_by_id(linterest.interest_id)
+
+def localid2common_interest(linterest_id):
+    """return Interest for a LocalInterest id, e.g., Route.interest_id, without loading the LocalInterest
+
+    Args:
+        linterest_id (int): LocalInterest.id
+
+    Returns:
+        Interest: Interest instance
+    """
+    return interestregistry.interest_by_id(interestregistry.localinterest_id2interest_id(linterest_id))
 
 def common2local_interest(cinterest):
     """return LocalInterest for an Interest
@@ -30,7 +143,7 @@ def common2local_interest(cinterest):
     Returns:
         LocalInterest: LocalInterest instance
     """
-    return LocalInterest.query.filter_by(interest_id=cinterest.id).one()
+    return interestregistry.localinterest(cinterest.id)
 
 def localinterest():
     """return the currently selected LocalIntere
@@ -38,7 +151,5 @@ def localinterest():
     Returns:
         LocalInterest: LocalInterest instance, or None if no interest selected
     """
-    interest = Interest.query.filter_by(interest=g.interest).one_or_none()
-    return LocalInterest.query.filter_by(interest_id=interest.id).one() if interest else None
-
-
+    interest = get_interest(g.interest)
+    return common2local_interest(interest) if interest else None
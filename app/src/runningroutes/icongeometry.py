@@ -0,0 +1,153 @@
+###########################################################################################
+# icongeometry - cached icon geometry from svg files
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+icongeometry - cached icon geometry from svg files
+=======================================================
+the icon map needs the svg path, scale and anchor for each icon. These are parsed from the svg file
+when it is uploaded and saved as a json file in the cache folder, keyed by svg_file_id, and also
+remembered in memory
+
+cache entries record the svg file's modification time and size, and the configured MAP_ICON_WIDTH,
+and are reparsed if any of these change
+'''
+# standard
+from json import dump, load
+from os import makedirs, replace, getpid, stat
+from os.path import join, exists, dirname
+from re import fullmatch
+from threading import Lock
+import xml.etree.ElementTree as ET
+
+# pypi
+from flask import current_app
+
+# homegrown
+from .files import get_fidfilepath, get_fidfile_mmap
+
+# {svg_file_id: geometry}
+memorycache = {}
+memorycache_lock = Lock()
+
+# css pixels per unit, for svg width and height
+SVG_UNITS = {'': 1, 'px': 1, 'pt': 4/3, 'pc': 16, 'mm': 96/25.4, 'cm': 96/2.54, 'in': 96}
+
+# ----------------------------------------------------------------------
+def svg_length(value):
+    '''
+    convert svg width or height attribute to pixels
+
+    :param value: attribute value, e.g., '24', '24px', '0.25in', or None
+    :return: pixels, 0 if missing or if units are relative, e.g., '%' or 'em'
+    '''
+    match = fullmatch(r'\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([a-z%]*)\s*', value or '')
+    if not match or match.group(2) not in SVG_UNITS:
+        return 0
+    return float(match.group(1)) * SVG_UNITS[match.group(2)]
+
+# ----------------------------------------------------------------------
+def parse_icon_geometry(contents, iconwidth):
+    '''
+    parse icon geometry from svg file contents
+
+    :param contents: bytes-like svg file contents
+    :param iconwidth: configured icon width on map
+    :return: {'path': svg path d, 'scale': scale, 'anchor': [x, y], 'numpaths': number of paths}
+    '''
+    parser = ET.XMLParser()
+    parser.feed(contents)
+    svgitem = parser.close()
+
+    pathl = []
+    scale = 1
+    anchor = [0, 0]
+    for el in svgitem.iter():
+        # determine scale based on width vs. configured width
+        if el.tag.split('}')[1] == 'svg':
+            width = svg_length(el.get('width'))
+            height = svg_length(el.get('height'))
+            # if width not there assume square
+            if not width:
+                width = height
+            # height and width not there, so just leave scale at 1
+            if width:
+                scale = iconwidth / width
+            # set anchor based on height and width if present
+            anchor[0] = scale*width/2 if width else 0
+            anchor[1] = scale*height/2 if height else 0
+        # look past the {namespace} portion of the tag {namespace}path
+        if el.tag.split('}')[1] == 'path' and el.get('fill') != 'none':
+            pathl.append(el.get('d'))
+
+    return {'path': ' '.join(pathl), 'scale': scale, 'anchor': anchor, 'numpaths': len(pathl)}
+
+# ----------------------------------------------------------------------
+def _cachefile(fid):
+    cachefolder = current_app.config.get('APP_ICONS_CACHE_FOLDER', join(current_app.config['APP_FILE_FOLDER'], '_cache', 'icons'))
+    return join(cachefolder, '{}.json'.format(fid))
+
+# ----------------------------------------------------------------------
+def _signature(filepath):
+    filestat = stat(filepath)
+    return [filestat.st_mtime_ns, filestat.st_size, current_app.config['MAP_ICON_WIDTH']]
+
+# ----------------------------------------------------------------------
+def update_icon_geometry(fid):
+    '''
+    parse svg file and save icon geometry in cache
+
+    :param fid: svg_file_id
+    :return: {'path', 'scale', 'anchor'}, see parse_icon_geometry()
+    '''
+    filepath = get_fidfilepath(fid)
+    signature = _signature(filepath)
+    geometry = parse_icon_geometry(get_fidfile_mmap(fid)['contents'], current_app.config['MAP_ICON_WIDTH'])
+    # numpaths is only for checking here, it isn't sent to clients
+    if geometry.pop('numpaths') != 1:
+        current_app.logger.debug('update_icon_geometry(): multiple paths found for svg file {}'.format(fid))
+
+    # write to temporary file and rename so readers never see a partial file
+    cachefile = _cachefile(fid)
+    makedirs(dirname(cachefile), exist_ok=True)
+    tmppath = '{}.{}.tmp'.format(cachefile, getpid())
+    with open(tmppath, 'w') as f:
+        dump({'signature': signature, 'geometry': geometry}, f)
+    replace(tmppath, cachefile)
+
+    with memorycache_lock:
+        memorycache[fid] = (signature, geometry)
+    return geometry
+
+# ----------------------------------------------------------------------
+def get_icon_geometry(fid):
+    '''
+    get icon geometry for svg file, parsing the file only if not cached
+
+    :param fid: svg_file_id
+    :return: {'path', 'scale', 'anchor'}, see update_icon_geometry()
+    '''
+    signature = _signature(get_fidfilepath(fid))
+
+    with memorycache_lock:
+        cached = memorycache.get(fid)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    cachefile = _cachefile(fid)
+    if exists(cachefile):
+        with open(cachefile) as f:
+            cached = load(f)
+        if cached['signature'] == signature:
+            # files written before numpaths was removed from the cached geometry
+            cached['geometry'].pop('numpaths', None)
+            with memorycache_lock:
+                memorycache[fid] = (signature, cached['geometry'])
+            return cached['geometry']
+
+    return update_icon_geometry(fid)
@@ -0,0 +1,266 @@
+###########################################################################################
+# iconmapcache - precomputed icon map page payload
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+iconmapcache - precomputed icon map page payload
+=====================================================
+the icon map page heading, map center and features only change when an icon admin edits something,
+or when a location's geocode cache is reloaded. The payload is compiled once per interest, and kept
+in the cache folder and in memory
+
+each payload records the versions of the rows it was built from, so it is rebuilt automatically if
+anything changes, e.g., by the refresh-locations command. The icon admin views also rebuild the payload
+after each edit, so the public page doesn't have to
+
+the rest response is also saved in its own file, with compressed variants, see precompress.py
+'''
+# standard
+from json import dumps, dump, load
+from os import makedirs, replace, getpid
+from os.path import join, exists, dirname
+from threading import Lock
+
+# pypi
+from flask import current_app
+from markdown import markdown
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload
+
+# homegrown
+from . import app
+from .models import db, IconLocation, IconMap, Icon, IconSubtype, Location
+from .geo import GmapsLoc, get_geocoder
+from .icongeometry import get_icon_geometry
+from .precompress import write_file_precompressed, precompressed_current
+
+# set up for google maps location management
+gmaps = GmapsLoc(app.config['GMAPS_ELEV_API_KEY'], geocoder=get_geocoder(app.config))
+
+# Icon attributes sent to client
+iconattrkeys = [c.key for c in inspect(Icon).column_attrs if c.key != 'interest']
+
+# {interest_id: payload}
+memorycache = {}
+memorycache_lock = Lock()
+
+# ----------------------------------------------------------------------
+def iconmap_query(interest_id):
+    '''
+    query for icon map of interest
+
+    :param interest_id: LocalInterest id
+    :return: Query
+    '''
+    return IconMap.query.filter_by(interest_id=interest_id)
+
+# ----------------------------------------------------------------------
+def iconmap_versions_query(interest_id):
+    '''
+    query for versions of icon map of interest and its location
+
+    :param interest_id: LocalInterest id
+    :return: Query
+    '''
+    return (db.session.query(IconMap.id, IconMap.version_id, Location.id, Location.version_id)
+            .outerjoin(Location, IconMap.location_id == Location.id)
+            .filter(IconMap.interest_id == interest_id))
+
+# ----------------------------------------------------------------------
+def iconlocation_versions_query(interest_id):
+    '''
+    query for versions of icon locations of interest and what they reference
+
+    :param interest_id: LocalInterest id
+    :return: Query
+    '''
+    return (db.session.query(IconLocation.id, IconLocation.version_id,
+                             Icon.id, Icon.version_id, Icon.svg_file_id,
+                             IconSubtype.id, IconSubtype.version_id,
+                             Location.id, Location.version_id)
+            .outerjoin(Icon, IconLocation.icon_id == Icon.id)
+            .outerjoin(IconSubtype, IconLocation.iconsubtype_id == IconSubtype.id)
+            .outerjoin(Location, IconLocation.location_id == Location.id)
+            .filter(IconLocation.interest_id == interest_id)
+            .order_by(IconLocation.id))
+
+# ----------------------------------------------------------------------
+def iconlocations_query(interest_id):
+    '''
+    query for icon locations of interest, with everything needed for the features
+
+    :param interest_id: LocalInterest id
+    :return: Query
+    '''
+    return (IconLocation.query
+            .filter_by(interest_id=interest_id)
+            .options(joinedload(IconLocation.icon),
+                     joinedload(IconLocation.iconsubtype),
+                     joinedload(IconLocation.location)))
+
+# ----------------------------------------------------------------------
+def iconmap_versions(interest_id):
+    '''
+    versions of everything which goes into the icon map payload
+
+    :param interest_id: LocalInterest id
+    :return: list of version tuples
+    '''
+    iconmaps = iconmap_versions_query(interest_id).all()
+    locations = iconlocation_versions_query(interest_id).all()
+    return [list(v) for v in iconmaps + locations]
+
+# ----------------------------------------------------------------------
+def iconmap_features(interest_id):
+    '''
+    build features for icon map
+
+    :param interest_id: LocalInterest id
+    :return: [feature, ...]
+    '''
+    # load everything needed for the features in one query
+    locations = iconlocations_query(interest_id).all()
+
+    features = []
+    geometry = {}
+    for location in locations:
+        fid = location.icon.svg_file_id
+        # get path, scale, anchor; parsed when the svg file was uploaded, see icongeometry.py
+        if fid not in geometry:
+            geometry[fid] = get_icon_geometry(fid)
+        # location cache is reloaded by the refresh-locations command, see locations.py
+        loc = gmaps.read_location(location.location)
+        # locations are geocoded by the admin views, or by refresh-locations if that failed. The
+        # payload is rebuilt when the location gets its coordinates, because its version changes
+        if loc['coordinates'][0] is None:
+            continue
+        latlng = loc['coordinates']
+        feature = {
+            'type' : 'Feature',
+            'geometry' : {
+                'type' : 'Point',
+                'coordinates' : latlng,
+                'properties' : {
+                    'name' : location.locname,
+                    'iconattrs' : {key: getattr(location.icon, key) for key in iconattrkeys},
+                    'path' : geometry[fid]['path'],
+                    'scale' : geometry[fid]['scale'],
+                    'anchor' : geometry[fid]['anchor'],
+                    'loctext' : location.location_popup_text if location.location_popup_text else location.location.location,
+                    'addl_text' : location.addl_text,
+                    'type' : location.icon.icon if location.icon else None,
+                    'subtype' : location.iconsubtype.iconsubtype if location.iconsubtype else None,
+                    'phone' : location.phone,
+                }
+            }
+        }
+
+        features.append( feature )
+
+    return features
+
+# ----------------------------------------------------------------------
+def _cachefile(interest_id):
+    cachefolder = current_app.config.get('APP_ICONMAP_CACHE_FOLDER', join(current_app.config['APP_FILE_FOLDER'], '_cache'))
+    return join(cachefolder, 'iconmap-{}.json'.format(interest_id))
+
+# ----------------------------------------------------------------------
+def _restfile(interest_id):
+    return _cachefile(interest_id)[:-len('.json')] + '-rest.json'
+
+# ----------------------------------------------------------------------
+def update_iconmap_cache(interest_id, versions=None):
+    '''
+    compile icon map payload for interest
+
+    caller must have committed updates
+
+    :param interest_id: LocalInterest id
+    :param versions: iconmap_versions(interest_id) if caller already has them
+    :return: payload {'versions', 'pagename', 'heading', 'mapcenter', 'featuresjson', 'tablejson'}
+        featuresjson has all features for the page; tablejson is the rest response, with features
+        filtered by isShownInTable
+    '''
+    if versions is None:
+        versions = iconmap_versions(interest_id)
+
+    iconmap = iconmap_query(interest_id).one_or_none()
+    if iconmap:
+        pagename = iconmap.page_title
+        heading = markdown(iconmap.page_description, extensions=['md_in_html', 'attr_list']) if iconmap.page_description else ''
+        loc = iconmap.location
+        mapcenter = [loc.lat, loc.lng]
+    else:
+        pagename = 'Icon Map'
+        heading = ''
+        mapcenter = [39.431206, -77.415428]
+
+    features = iconmap_features(interest_id)
+    tablefeatures = [f for f in features if f['geometry']['properties']['iconattrs']['isShownInTable']]
+    payload = {
+        'versions': versions,
+        'pagename': pagename,
+        'heading': heading,
+        'mapcenter': mapcenter,
+        'featuresjson': dumps(features),
+        # serialize the same way jsonify() does
+        'tablejson': current_app.json.dumps({'features': tablefeatures}),
+    }
+
+    # write to temporary file and rename so readers never see a partial file
+    cachefile = _cachefile(interest_id)
+    makedirs(dirname(cachefile), exist_ok=True)
+    tmppath = '{}.{}.tmp'.format(cachefile, getpid())
+    with open(tmppath, 'w') as f:
+        dump(payload, f)
+    replace(tmppath, cachefile)
+    write_file_precompressed(_restfile(interest_id), payload['tablejson'].encode('utf-8'))
+
+    with memorycache_lock:
+        memorycache[interest_id] = payload
+    return payload
+
+# ----------------------------------------------------------------------
+def get_iconmap_cache(interest_id):
+    '''
+    get icon map payload for interest, compiling it if anything has changed
+
+    :param interest_id: LocalInterest id
+    :return: payload, see update_iconmap_cache()
+    '''
+    versions = iconmap_versions(interest_id)
+
+    with memorycache_lock:
+        payload = memorycache.get(interest_id)
+    if payload and payload['versions'] == versions:
+        return payload
+
+    cachefile = _cachefile(interest_id)
+    if exists(cachefile):
+        with open(cachefile) as f:
+            payload = load(f)
+        if payload['versions'] == versions:
+            with memorycache_lock:
+                memorycache[interest_id] = payload
+            return payload
+
+    return update_iconmap_cache(interest_id, versions)
+
+# ----------------------------------------------------------------------
+def get_iconmap_restfile(interest_id, payload):
+    '''
+    get path of rest response file for interest
+
+    :param interest_id: LocalInterest id
+    :param payload: current payload from get_iconmap_cache()
+    :return: filepath of rest response, see precompress.precompressed_response()
+    '''
+    restfile = _restfile(interest_id)
+    if not exists(restfile) or not precompressed_current(restfile):
+        write_file_precompressed(restfile, payload['tablejson'].encode('utf-8'))
+    return restfile
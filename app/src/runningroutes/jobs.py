@@ -0,0 +1,253 @@
+###########################################################################################
+# jobs - background processing of uploaded route files
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+jobs - background processing of uploaded route files
+=========================================================
+uploaded gpx files are queued in the RouteJob table, and processed by the process-route-jobs
+flask command, which is run from crond (see app/cronjobs)
+
+while a job is running, its worker updates the job's started time every few minutes, so a job is
+only reclaimed by another worker if its worker has stopped, see RouteJobHeartbeat
+'''
+# standard
+from datetime import datetime, timedelta
+from threading import Thread, Event
+from time import sleep, monotonic
+from traceback import format_exc
+
+# pypi
+import click
+from flask import current_app
+
+# homegrown
+from .models import db, RouteJob, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED
+from .helpers import local2common_interest
+from .files import fidfile_query, gpxfile_routes_query
+from .routescache import update_routes_cache
+from .spatialindex import update_startindex
+
+# ----------------------------------------------------------------------
+def enqueue_routejob(linterest, gpx_fid, filename):
+    '''
+    queue uploaded route file for processing
+
+    :param linterest: LocalInterest for the route
+    :param gpx_fid: file id of uploaded gpx file
+    :param filename: original filename of uploaded file
+    :return: RouteJob
+    '''
+    job = RouteJob(interest=linterest, gpx_file_id=gpx_fid, filename=filename, status=JOB_QUEUED,
+                   created=datetime.now())
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+# ----------------------------------------------------------------------
+def routejob_response(job):
+    '''
+    return job status for client
+
+    :param job: RouteJob
+    :return: dict with job status, and calculated route values when job is done
+    '''
+    response = {
+        'job_id': job.id,
+        'status': job.status,
+        'gpx_file_id': job.gpx_file_id,
+    }
+    if job.status == JOB_DONE:
+        response.update({
+            'path_file_id': job.path_file_id,
+            'elevation_gain': job.elevation_gain,
+            'distance': '{:.1f}'.format(job.distance),
+            'start_location': job.start_location,
+        })
+    elif job.status == JOB_FAILED:
+        response['error'] = job.error
+    return response
+
+# ----------------------------------------------------------------------
+def stale_minutes():
+    '''
+    return number of minutes without a heartbeat after which a running job is considered abandoned
+    '''
+    return current_app.config.get('APP_ROUTEJOB_STALE_MINUTES', 10)
+
+########################################################################
+class RouteJobHeartbeat():
+    '''
+    context manager which periodically updates a running job's started time from a separate thread,
+    so the job isn't reclaimed while it is being processed
+
+    updates use their own connection so they are independent of the caller's session transaction
+
+    :param job: RouteJob claimed by claim_routejob()
+    :param interval: seconds between updates
+    '''
+    # ----------------------------------------------------------------------
+    def __init__(self, job, interval):
+        self.job_id = job.id
+        self.interval = interval
+        # engine is captured here because the thread has no app context
+        self.engine = db.engine
+        self.stopped = Event()
+        self.thread = Thread(target=self._worker, daemon=True)
+
+    # ----------------------------------------------------------------------
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    # ----------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
+
+    # ----------------------------------------------------------------------
+    def _worker(self):
+        table = RouteJob.__table__
+        while not self.stopped.wait(self.interval):
+            with self.engine.begin() as conn:
+                conn.execute(table.update()
+                             .where((table.c.id == self.job_id) & (table.c.status == JOB_RUNNING))
+                             .values(started=datetime.now()))
+
+# ----------------------------------------------------------------------
+def claimable_routejobs_query(stale):
+    '''
+    query for jobs which may be claimed
+
+    :param stale: running jobs which started before this time may be claimed
+    :return: Query
+    '''
+    return (RouteJob.query
+            .filter((RouteJob.status == JOB_QUEUED) | ((RouteJob.status == JOB_RUNNING) & (RouteJob.started < stale)))
+            .order_by(RouteJob.id))
+
+# ----------------------------------------------------------------------
+def routejob_query(jobid, interest_id):
+    '''
+    query for job of interest
+
+    :param jobid: RouteJob id
+    :param interest_id: LocalInterest id
+    :return: Query
+    '''
+    return RouteJob.query.filter_by(id=jobid, interest_id=interest_id)
+
+# ----------------------------------------------------------------------
+def claim_routejob():
+    '''
+    claim the oldest queued job, or a job which was abandoned by a worker
+
+    the claim is an update conditioned on the job's status, so if several workers are running
+    only one of them gets each job
+
+    :return: RouteJob, or None if there is nothing to do
+    '''
+    stale = datetime.now() - timedelta(minutes=stale_minutes())
+    while True:
+        job = claimable_routejobs_query(stale).first()
+        if not job:
+            db.session.rollback()
+            return None
+
+        claimed = (RouteJob.query
+                   .filter_by(id=job.id, status=job.status, started=job.started)
+                   .update({'status': JOB_RUNNING, 'started': datetime.now()}, synchronize_session=False))
+        db.session.commit()
+        if claimed:
+            db.session.refresh(job)
+            return job
+
+# ----------------------------------------------------------------------
+def run_routejob(job):
+    '''
+    process the route file for a claimed job, and update the job with the results
+
+    any routes which were already saved with this gpx file are updated as well
+
+    :param job: RouteJob claimed by claim_routejob()
+    '''
+    # deferred import because routepath sets up elevation clients from app configuration
+    from .routepath import process_routefile, snaploc
+
+    try:
+        group = local2common_interest(job.interest).interest
+        gpxfile = fidfile_query(job.gpx_file_id).one()
+        filepath = '{}/{}/{}'.format(current_app.config['APP_FILE_FOLDER'], group, gpxfile.fileid)
+        # heartbeat well within the stale window
+        with RouteJobHeartbeat(job, stale_minutes() * 60 / 4):
+            results = process_routefile(group, filepath, job.filename)
+
+        job.path_file_id = results['path_file_id']
+        job.elevation_gain = results['elevation_gain']
+        job.distance = float(results['distance'])
+        job.start_location = results['start_location']
+        job.status = JOB_DONE
+        job.finished = datetime.now()
+
+        # route may have been saved before the job finished
+        routes = gpxfile_routes_query(job.gpx_file_id).all()
+        for route in routes:
+            route.path_file_id = job.path_file_id
+            if not route.distance:
+                route.distance = job.distance
+            if not route.elevation_gain:
+                route.elevation_gain = job.elevation_gain
+            # same start location processing as when the route is saved, see views/admin/routes.py
+            if not route.start_location:
+                route.start_location = job.start_location
+                route.latlng = snaploc(route.interest_id, route.start_location)
+                update_startindex(route.interest_id, route.id, route.latlng)
+            pathfile = fidfile_query(job.path_file_id).one()
+            pathfile.route_id = route.id
+
+        db.session.commit()
+
+        if routes:
+            update_routes_cache(job.interest)
+
+    except Exception:
+        db.session.rollback()
+        current_app.logger.error('run_routejob(): job {} failed\n{}'.format(job.id, format_exc()))
+        job.status = JOB_FAILED
+        job.error = format_exc()
+        job.finished = datetime.now()
+        db.session.commit()
+
+# ----------------------------------------------------------------------
+def process_routejobs(seconds=0, pollinterval=2):
+    '''
+    process queued jobs
+
+    :param seconds: keep polling for new jobs for this many seconds, 0 to return when queue is empty
+    :param pollinterval: seconds between polls when queue is empty
+    :return: number of jobs processed
+    '''
+    endtime = monotonic() + seconds
+    numjobs = 0
+    while True:
+        job = claim_routejob()
+        if job:
+            current_app.logger.info('process_routejobs(): processing job {} file {}'.format(job.id, job.filename))
+            run_routejob(job)
+            numjobs += 1
+            continue
+
+        if monotonic() + pollinterval > endtime:
+            return numjobs
+        sleep(pollinterval)
+
+@click.command('process-route-jobs')
+@click.option('--seconds', default=0, help='keep polling for new jobs for this many seconds')
+def process_route_jobs_command(seconds):
+    '''process queued route file jobs'''
+    process_routejobs(seconds=seconds)
@@ -9,13 +9,20 @@
 ###########################################################################################
 
 # standard
+from datetime import datetime, timedelta
+from traceback import format_exc
+
+# pypi
+import click
+from sqlalchemy import or_
 
 # home grown
 from . import app
-from .geo import GmapsLoc
+from .geo import GmapsLoc, get_geocoder
+from .models import db, Location
 
 # set up for google maps location management
-gmaps = GmapsLoc(app.config['GMAPS_ELEV_API_KEY'])
+gmaps = GmapsLoc(app.config['GMAPS_ELEV_API_KEY'], geocoder=get_geocoder(app.config))
 
 # functions used by MethodView classes which use IconLocationCrud
 # validate location subrecord
@@ -39,3 +46,57 @@ def get_location(dbrow):
     else:
         loc = dbrow.location.location
     return loc
+
+# ----------------------------------------------------------------------
+def refresh_locations_query(cutoff, batchsize):
+    '''
+    query for locations to be reloaded
+
+    :param cutoff: locations cached before this time are reloaded
+    :param batchsize: maximum number of locations
+    :return: Query
+    '''
+    return (Location.query
+            .filter(Location.geoloc_required == True, or_(Location.cached == None, Location.cached < cutoff))
+            .order_by(Location.cached)
+            .limit(batchsize))
+
+# ----------------------------------------------------------------------
+def refresh_locations(margin, batchsize):
+    '''
+    reload Location cache entries which have expired or will expire within margin days, so
+    requests never need to geocode
+
+    :param margin: number of days before expiration to reload cache entry
+    :param batchsize: maximum number of locations to reload
+    :return: number of locations reloaded
+    '''
+    cache_limit = app.config['GMAPS_CACHE_LIMIT']
+    # separate client so the refresher can be throttled independently of interactive use
+    refreshgmaps = GmapsLoc(app.config['GMAPS_ELEV_API_KEY'],
+                            queries_per_second=app.config.get('APP_GEOCODE_REFRESH_QPS', 10),
+                            geocoder=get_geocoder(app.config))
+
+    refreshlimit = max(cache_limit - margin, 0)
+    cutoff = datetime.now() - timedelta(refreshlimit)
+    locations = refresh_locations_query(cutoff, batchsize).all()
+
+    numlocs = 0
+    for location in locations:
+        # get_location reloads cache entries older than refreshlimit, and commits
+        try:
+            refreshgmaps.get_location(location.location, location.id, refreshlimit)
+            numlocs += 1
+        except Exception:
+            db.session.rollback()
+            app.logger.error('refresh_locations(): error reloading location {}\n{}'.format(location.location, format_exc()))
+
+    return numlocs
+
+@click.command('refresh-locations')
+@click.option('--margin', default=3, help='reload locations this many days before they expire')
+@click.option('--batchsize', default=100, help='maximum number of locations to reload')
+def refresh_locations_command(margin, batchsize):
+    '''reload location geocode cache entries before they expire'''
+    numlocs = refresh_locations(margin, batchsize)
+    app.logger.info('refresh_locations_command(): reloaded {} locations'.format(numlocs))
@@ -16,6 +16,8 @@ from copy import deepcopy
 from flask_sqlalchemy import SQLAlchemy
 from flask_security import UserMixin, RoleMixin
 from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
 
 class parameterError(Exception): pass
 
@@ -35,6 +37,7 @@ DateTime = db.DateTime
 Sequence = db.Sequence
 Enum = db.Enum
 UniqueConstraint = db.UniqueConstraint
+Index = db.Index
 ForeignKey = db.ForeignKey
 relationship = db.relationship
 backref = db.backref
@@ -64,6 +67,7 @@ URL_LEN = 2047      # https://stackoverflow.com/questions/417142/what-is-the-max
 TURN_LEN = 256
 GPXROW_LEN = 256
 ICONPAGE_LEN = 2048
+JOBSTATUS_LEN = 16
 
 # icons
 ICONNAME_LEN = 32
@@ -93,6 +97,12 @@ ROLE_ICON_ADMIN = 'icon-admin'
 # fake route name for "route" for icon files
 ICON_FILE_ROUTE = '***iconfile***'
 
+# RouteJob.status values
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
 # application specific stuff
 
 class Route(Base):
@@ -101,8 +111,8 @@ class Route(Base):
     version_id          = Column(Integer, nullable=False, default=1)
     interest_id         = Column(Integer, ForeignKey('localinterest.id'))
     interest            = relationship("LocalInterest")
-    gpx_file_id         = Column(String(FILEID_LEN))
-    path_file_id        = Column(String(FILEID_LEN))
+    gpx_file_id         = Column(String(FILEID_LEN), index=True)
+    path_file_id        = Column(String(FILEID_LEN), index=True)
     name                = Column(String(ROUTENAME_LEN))
     distance            = Column(Float)
     start_location      = Column(String(LATLNG_LEN))
@@ -113,6 +123,33 @@ class Route(Base):
     description         = Column(String(DESCR_LEN))
     turns               = Column(Text)
     active              = Column(LiberalBoolean)
+    # covers the route version queries used for etags and cache signatures
+    __table_args__ = (
+        Index('ix_route_interest_id_version_id', 'interest_id', 'version_id'),
+    )
+
+class RouteJob(Base):
+    __tablename__ = 'routejob'
+    id                  = Column(Integer(), primary_key=True)
+    version_id          = Column(Integer, nullable=False, default=1)
+    interest_id         = Column(Integer, ForeignKey('localinterest.id'))
+    interest            = relationship("LocalInterest")
+    status              = Column(String(JOBSTATUS_LEN), default=JOB_QUEUED)
+    gpx_file_id         = Column(String(FILEID_LEN))
+    filename            = Column(String(FILENAME_LEN))
+    created             = Column(DateTime)
+    started             = Column(DateTime)
+    finished            = Column(DateTime)
+    # filled in by worker when finished
+    path_file_id        = Column(String(FILEID_LEN))
+    distance            = Column(Float)
+    start_location      = Column(String(LATLNG_LEN))
+    elevation_gain      = Column(Integer)
+    error               = Column(Text)
+    # used by jobs.claim_routejob()
+    __table_args__ = (
+        Index('ix_routejob_status_started', 'status', 'started'),
+    )
 
 class Files(Base):
     __tablename__ = 'files'
@@ -121,7 +158,7 @@ class Files(Base):
     interest            = relationship("LocalInterest")
     route_id            = Column(Integer, ForeignKey('route.id'))
     route               = relationship("Route")
-    fileid              = Column(String(FILEID_LEN))
+    fileid              = Column(String(FILEID_LEN), index=True)
     filename            = Column(String(FILENAME_LEN))
     mimetype            = Column(String(MIMETYPE_LEN))
 
@@ -157,6 +194,20 @@ class Location(Base):
                                             # only set if geoloc_required is True
     lat                 = Column(Float)
     lng                 = Column(Float)
+    # used by locations.refresh_locations()
+    __table_args__ = (
+        Index('ix_location_geoloc_required_cached', 'geoloc_required', 'cached'),
+    )
+
+# geocode results by normalized address, see geo.GeocodeCache
+class GeocodeResult(Base):
+    __tablename__ = 'geocoderesult'
+    id                  = Column(Integer(), primary_key=True)
+    address             = Column(String(LOCATION_LEN), unique=True)
+    found               = Column(Boolean)
+    lat                 = Column(Float)
+    lng                 = Column(Float)
+    cached              = Column(DateTime)  # 30 day cache limit per https://cloud.google.com/maps-platform/terms/maps-service-terms
 
 class IconLocation(Base):
     __tablename__ = 'iconlocation'
@@ -188,6 +239,17 @@ class IconMap(Base):
     location_id         = Column(Integer, ForeignKey('location.id'))
     location            = relationship("Location")
 
+# version_id is used in ETags and cache signatures, so it has to change whenever the row changes. It is
+# incremented in the UPDATE statement rather than declared as version_id_col, which would also add an
+# optimistic concurrency check, and raise StaleDataError for concurrent admin edits, route jobs and
+# location refreshes. The admin views check version_id themselves, see loutilities CrudApi version_id_col
+def _increment_version_id(mapper, connection, target):
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version_id = mapper.class_.version_id + 1
+
+for versionedmodel in [Route, Icon, IconSubtype, Location, IconLocation, IconMap]:
+    event.listen(versionedmodel, 'before_update', _increment_version_id)
+
 # copied by update_local_tables
 class LocalUser(LocalUserMixin, Base):
     __tablename__ = 'localuser'
@@ -203,7 +265,7 @@ class LocalUser(LocalUserMixin, Base):
 class LocalInterest(Base):
     __tablename__ = 'localinterest'
     id                  = Column(Integer(), primary_key=True)
-    interest_id         = Column(Integer)
+    interest_id         = Column(Integer, index=True)
 
     version_id          = Column(Integer, nullable=False, default=1)
     __mapper_args__ = {
@@ -312,3 +374,9 @@ def update_local_tables():
     localtables = ManageLocalTables(db, 'routes', LocalUser, LocalInterest, hasuserinterest=True)
     localtables.update()
 
+    # interests may have changed, imported here because helpers, navcontext import models
+    from .helpers import interestregistry
+    from .navcontext import navcontextcache
+    interestregistry.invalidate()
+    navcontextcache.invalidate()
+
@@ -0,0 +1,136 @@
+###########################################################################################
+# navcontext - cached navigation context
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+navcontext - cached navigation context
+===========================================
+the interest selector in layout.jinja2 needs the interests the user can choose from. Public interests
+are remembered for the life of the process, and a logged in user's interests are remembered in their
+session, so building the list doesn't normally query the database. The list is only built when a
+template is rendered
+
+everything is invalidated by update_local_tables(), and otherwise reloaded after
+APP_NAV_CACHE_MAXAGE seconds (default 300), because other processes can't see the invalidation
+'''
+# standard
+from threading import Lock
+from time import monotonic, time
+
+# pypi
+from flask import current_app, session
+from flask_security import current_user
+from loutilities.user.model import Interest, Application
+from sqlalchemy.orm import make_transient_to_detached
+
+# homegrown
+from .models import db
+
+class NavContextCache():
+    '''
+    process level cache of current application and public interests
+    '''
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        self.lock = Lock()
+        self.invalidate()
+
+    # ----------------------------------------------------------------------
+    def invalidate(self):
+        '''
+        forget everything, so the next use reloads
+        '''
+        with self.lock:
+            self.loaded = None
+            self.application = None
+            self.publicinterests = None
+            # users' sessions were cached before this time
+            self.invalidated = time()
+
+    # ----------------------------------------------------------------------
+    def _load(self):
+        id, application, version_id = (db.session.query(Application.id, Application.application, Application.version_id)
+                                       .filter_by(application=current_app.config['APP_LOUTILITY']).one())
+        thisapp = Application(id=id, application=application, version_id=version_id)
+        make_transient_to_detached(thisapp)
+
+        pubinterests = (db.session.query(Interest.interest, Interest.description)
+                        .filter(Interest.public == True, Interest.applications.any(Application.id == id))
+                        .all())
+        publicinterests = sort_interests(pubinterests)
+
+        with self.lock:
+            self.application, self.publicinterests = thisapp, publicinterests
+            self.loaded = monotonic()
+
+    # ----------------------------------------------------------------------
+    def _check(self):
+        if self.loaded is None or monotonic() - self.loaded > current_app.config.get('APP_NAV_CACHE_MAXAGE', 300):
+            self._load()
+
+    # ----------------------------------------------------------------------
+    def loutility(self):
+        '''
+        return Application for this application, attached to the current session
+
+        :return: Application instance
+        '''
+        self._check()
+        # merge without load doesn't query the database
+        return db.session.merge(self.application, load=False)
+
+    # ----------------------------------------------------------------------
+    def public_interests(self):
+        '''
+        return public interests for this application
+
+        :return: [{'interest': slug, 'description': description}, ...] sorted by description
+        '''
+        self._check()
+        return self.publicinterests
+
+navcontextcache = NavContextCache()
+
+# ----------------------------------------------------------------------
+def sort_interests(interests):
+    '''
+    return interests as list of dicts sorted by description
+
+    :param interests: iterable of objects with interest, description attributes
+    :return: [{'interest': slug, 'description': description}, ...]
+    '''
+    return sorted([{'interest': i.interest, 'description': i.description} for i in interests],
+                  key=lambda a: a['description'].lower())
+
+# ----------------------------------------------------------------------
+def user_interests():
+    '''
+    return interests for the interest selector
+
+    :return: [{'interest': slug, 'description': description}, ...] sorted by description
+    '''
+    if not current_user.is_authenticated:
+        return navcontextcache.public_interests()
+
+    maxage = current_app.config.get('APP_NAV_CACHE_MAXAGE', 300)
+    cached = session.get('user_interests')
+    if (cached and cached['user_id'] == current_user.id
+            and cached['cached'] > navcontextcache.invalidated and time() - cached['cached'] <= maxage):
+        return cached['interests']
+
+    loutility = navcontextcache.loutility()
+    interests = sort_interests([i for i in current_user.interests if loutility in i.applications])
+    session['user_interests'] = {'user_id': current_user.id, 'cached': time(), 'interests': interests}
+    return interests
+
+# ----------------------------------------------------------------------
+def navcontext():
+    '''
+    context processor for layout.jinja2
+    '''
+    return {'user_interests': user_interests()}
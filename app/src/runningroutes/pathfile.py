@@ -0,0 +1,170 @@
+###########################################################################################
+# pathfile - binary columnar route path file
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+pathfile - binary columnar route path file
+===============================================
+the path file holds the densified route path, one column after another, preceded by a small header
+
+    offset  type            contents
+    0       6 bytes         magic, b'RRPATH'
+    6       uint16          format version
+    8       uint32          number of points, n
+    12      uint32          reserved, 0
+    16      float64[n]      lat, degrees
+            float64[n]      lng, degrees
+            float32[n]      orig_ele, meters, from elevation provider
+            float32[n]      res, meters, elevation resolution
+            float32[n]      ele, meters, smoothed
+            float32[n]      cumdist_km
+            uint8[n]        inserted, 1 if point was inserted by densifier
+            uint8[n]        lod, level of detail, see simplify.py (version 2 and later)
+
+all values are little endian. Columns are returned by read_pathfile() as numpy views into the file
+contents, so reading a path does not parse anything
+
+older path files were csv with header lat,lng,orig_ele,res,ele,cumdist_km,inserted; csv2pathfile()
+converts these. Version 1 files don't have the lod column, pathfile_version() can be used to find
+these so they can be rewritten
+'''
+# standard
+from csv import DictReader
+from struct import Struct
+
+# pypi
+import numpy
+
+# homegrown
+from .simplify import path_lod
+
+class PathFileError(Exception): pass
+
+PATHFILE_MAGIC = b'RRPATH'
+PATHFILE_VERSION = 2
+PATHFILE_MIMETYPE = 'application/x-runningroutes-path'
+PATHFILE_EXT = '.path'
+
+# magic, version, npoints, reserved
+header = Struct('<6sHII')
+
+# column name, dtype in file order
+pathcolumns = [
+    ('lat', numpy.dtype('<f8')),
+    ('lng', numpy.dtype('<f8')),
+    ('orig_ele', numpy.dtype('<f4')),
+    ('res', numpy.dtype('<f4')),
+    ('ele', numpy.dtype('<f4')),
+    ('cumdist_km', numpy.dtype('<f4')),
+    ('inserted', numpy.dtype('u1')),
+    ('lod', numpy.dtype('u1')),
+]
+
+# columns for each format version
+versioncolumns = {
+    1: pathcolumns[:-1],
+    2: pathcolumns,
+}
+
+# ----------------------------------------------------------------------
+def is_pathfile(contents):
+    '''
+    check whether contents are a binary path file
+
+    :param contents: bytes-like file contents, or at least the first header.size bytes
+    :return: True if contents start with the path file magic
+    '''
+    return bytes(contents[:len(PATHFILE_MAGIC)]) == PATHFILE_MAGIC
+
+# ----------------------------------------------------------------------
+def pathfile_version(contents):
+    '''
+    get format version of binary path file
+
+    :param contents: bytes-like file contents, or at least the first header.size bytes
+    :return: format version
+    '''
+    if len(contents) < header.size or not is_pathfile(contents):
+        raise PathFileError('pathfile_version(): not a path file')
+    magic, version, npoints, reserved = header.unpack_from(contents, 0)
+    return version
+
+# ----------------------------------------------------------------------
+def write_pathfile(filepath, **columns):
+    '''
+    write binary path file
+
+    :param filepath: path of file to write
+    :param columns: array-like for each column in pathcolumns, all the same length; None values
+        are written as nan (0 for inserted). lod is calculated from the other columns if not given
+    '''
+    if 'lod' not in columns and all(name in columns for name in ['lat', 'lng', 'ele', 'cumdist_km']):
+        columns['lod'] = path_lod(columns['lat'], columns['lng'], columns['ele'], columns['cumdist_km'])
+
+    missing = [name for name, dtype in pathcolumns if name not in columns]
+    if missing:
+        raise PathFileError('write_pathfile(): missing columns {}'.format(missing))
+
+    npoints = len(columns['lat'])
+    with open(filepath, mode='wb') as pathfile:
+        pathfile.write(header.pack(PATHFILE_MAGIC, PATHFILE_VERSION, npoints, 0))
+        for name, dtype in pathcolumns:
+            values = columns[name]
+            if len(values) != npoints:
+                raise PathFileError('write_pathfile(): column {} has {} points, expected {}'.format(name, len(values), npoints))
+            if dtype.kind == 'f':
+                values = [numpy.nan if v is None else v for v in values]
+            elif name == 'inserted':
+                values = [1 if v else 0 for v in values]
+            pathfile.write(numpy.asarray(values, dtype=dtype).tobytes())
+
+# ----------------------------------------------------------------------
+def read_pathfile(contents):
+    '''
+    read binary path file
+
+    :param contents: bytes-like file contents, e.g., bytes, mmap, numpy.memmap
+    :return: dict of numpy arrays, one for each column in the file's version of pathcolumns
+    '''
+    if len(contents) < header.size:
+        raise PathFileError('read_pathfile(): file too short')
+    magic, version, npoints, reserved = header.unpack_from(contents, 0)
+    if magic != PATHFILE_MAGIC:
+        raise PathFileError('read_pathfile(): not a path file')
+    if version not in versioncolumns:
+        raise PathFileError('read_pathfile(): unsupported version {}'.format(version))
+
+    path = {}
+    offset = header.size
+    for name, dtype in versioncolumns[version]:
+        path[name] = numpy.frombuffer(contents, dtype=dtype, count=npoints, offset=offset)
+        offset += dtype.itemsize * npoints
+    return path
+
+# ----------------------------------------------------------------------
+def csv2pathfile(csvlines, filepath):
+    '''
+    convert csv path file to binary path file
+
+    :param csvlines: iterable of csv lines, with header lat,lng,orig_ele,res,ele,cumdist_km,inserted
+    :param filepath: path of binary file to write
+    :return: number of points converted
+    '''
+    # lod is calculated by write_pathfile()
+    csvcolumns = versioncolumns[1]
+    columns = {name: [] for name, dtype in csvcolumns}
+    for row in DictReader(csvlines):
+        for name, dtype in csvcolumns:
+            value = row.get(name)
+            if name == 'inserted':
+                columns[name].append(value == 'inserted')
+            else:
+                columns[name].append(float(value) if value not in [None, ''] else None)
+
+    write_pathfile(filepath, **columns)
+    return len(columns['lat'])
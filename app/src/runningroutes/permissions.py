@@ -0,0 +1,93 @@
+###########################################################################################
+# permissions - permission resolution shared by frontend and admin views
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+permissions - permission resolution shared by frontend and admin views
+===========================================================================
+the user's roles and the user's interests are looked up at most once per request, and remembered on
+g. Role ids never change once the database is initialized, so they are remembered for the life of the
+process. Interests come from the interest registry, see helpers.py
+'''
+# pypi
+from flask import g
+from flask_security import current_user
+from loutilities.user.model import Role
+
+# homegrown
+from .models import ROLE_SUPER_ADMIN
+
+# {role name: role id}
+roleids = {}
+
+# ----------------------------------------------------------------------
+def role_id(name):
+    '''
+    return id of role
+
+    :param name: role name
+    :return: Role.id
+    '''
+    if name not in roleids:
+        roleids[name] = Role.query.filter_by(name=name).one().id
+    return roleids[name]
+
+# ----------------------------------------------------------------------
+def _requestcache():
+    if 'permissions' not in g:
+        g.permissions = {}
+    return g.permissions
+
+# ----------------------------------------------------------------------
+def user_role_ids():
+    '''
+    return ids of current_user's roles
+
+    :return: set of Role.id, empty if not logged in
+    '''
+    cache = _requestcache()
+    if 'roleids' not in cache:
+        cache['roleids'] = {r.id for r in current_user.roles} if current_user.is_authenticated else set()
+    return cache['roleids']
+
+# ----------------------------------------------------------------------
+def user_interest_ids():
+    '''
+    return ids of current_user's interests
+
+    :return: set of Interest.id, empty if not logged in
+    '''
+    cache = _requestcache()
+    if 'userinterestids' not in cache:
+        cache['userinterestids'] = {i.id for i in current_user.interests} if current_user.is_authenticated else set()
+    return cache['userinterestids']
+
+# ----------------------------------------------------------------------
+def has_role_permission(interest, rolename):
+    '''
+    check if current_user can administer interest with role
+
+    :param interest: Interest instance
+    :param rolename: role required, in addition to access to the interest
+    :rtype: boolean
+    '''
+    # need to be logged in
+    if not current_user.is_authenticated:
+        return False
+
+    # is someone logged in with ROLE_SUPER_ADMIN role? They're good
+    roles = user_role_ids()
+    if role_id(ROLE_SUPER_ADMIN) in roles:
+        return True
+
+    # if they're not logged in with rolename role, they're bad
+    if role_id(rolename) not in roles:
+        return False
+
+    # current_user has rolename. Can this user access interest?
+    return interest.id in user_interest_ids()
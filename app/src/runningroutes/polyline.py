@@ -0,0 +1,72 @@
+###########################################################################################
+# polyline - compact encodings for route paths
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+polyline - compact encodings for route paths
+=================================================
+lat, lng are encoded as a Google encoded polyline, see
+https://developers.google.com/maps/documentation/utilities/polylinealgorithm, which the google maps
+javascript api can decode with google.maps.geometry.encoding.decodePath()
+
+other values, e.g., elevation, are rounded to a fixed number of decimal places, scaled to integers
+and delta encoded, i.e., the first value followed by the difference from each previous value. To
+decode, keep a running sum and divide by 10**precision
+'''
+# pypi
+import numpy
+
+# ----------------------------------------------------------------------
+def _fillnan(values):
+    # unknown values are replaced with the previous known value, or 0 if there isn't one
+    values = numpy.asarray(values, dtype=float)
+    nans = numpy.isnan(values)
+    if nans.any():
+        ndx = numpy.where(~nans, numpy.arange(len(values)), 0)
+        numpy.maximum.accumulate(ndx, out=ndx)
+        values = values[ndx]
+        values[numpy.isnan(values)] = 0
+    return values
+
+# ----------------------------------------------------------------------
+def delta_encode(values, precision):
+    '''
+    delta encode values
+
+    :param values: array-like of floats, nan for unknown values
+    :param precision: number of decimal places to keep
+    :return: list of ints, first value followed by differences
+    '''
+    scaled = numpy.round(_fillnan(values) * 10**precision).astype(numpy.int64)
+    return numpy.diff(scaled, prepend=0).tolist()
+
+# ----------------------------------------------------------------------
+def encode_polyline(lat, lng, precision=5):
+    '''
+    encode lat, lng as Google encoded polyline
+
+    :param lat: array-like of latitude, degrees
+    :param lng: array-like of longitude, degrees
+    :param precision: number of decimal places to keep, 5 for google maps
+    :return: encoded polyline string
+    '''
+    # interleave lat, lng deltas as the algorithm requires
+    deltas = numpy.column_stack((delta_encode(lat, precision), delta_encode(lng, precision))).ravel() if len(lat) else []
+
+    chunks = []
+    for delta in deltas:
+        # zigzag so sign is in the low bit
+        value = int(delta) << 1
+        if delta < 0:
+            value = ~value
+        # 5 bit chunks, low order first, 0x20 set on all but the last
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return ''.join(chunks)
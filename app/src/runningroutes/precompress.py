@@ -0,0 +1,182 @@
+###########################################################################################
+# precompress - precompressed file variants and content negotiation
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+precompress - precompressed file variants and content negotiation
+======================================================================
+files which are served many times but change rarely, e.g., cached json artifacts and the asset
+bundles built by flask-assets, are compressed once when they are written, into .br and .gz files
+next to the original. Responses are built from the best variant the client accepts, so nothing is
+compressed per request
+
+a variant is only used if it is at least as new as the original, so a rebuilt original is never
+served with stale compressed content
+'''
+# standard
+from gzip import compress as gzip_compress
+from mimetypes import guess_type
+from os import makedirs, replace, getpid, stat, listdir
+from os.path import join, exists, dirname, isfile, isdir
+
+# pypi
+import brotli
+import click
+from flask import current_app, request, send_file
+from werkzeug.security import safe_join
+
+# (content-encoding, file suffix) in order of preference
+ENCODINGS = [
+    ('br', '.br'),
+    ('gzip', '.gz'),
+]
+
+# compressing anything else, e.g., images, isn't worthwhile
+COMPRESSIBLE_MIMETYPES = ['application/json', 'application/javascript', 'text/javascript', 'text/css',
+                          'image/svg+xml', 'text/plain', 'text/html']
+
+# static files in this folder are built by flask-assets, see assets.py
+ASSETS_GEN_FOLDER = 'gen/'
+
+# ----------------------------------------------------------------------
+def compress(data, encoding):
+    '''
+    compress data
+
+    :param data: bytes
+    :param encoding: content-encoding from ENCODINGS
+    :return: compressed bytes
+    '''
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    else:
+        # mtime=0 so the same data always compresses to the same bytes
+        return gzip_compress(data, compresslevel=9, mtime=0)
+
+# ----------------------------------------------------------------------
+def _writefile(filepath, data):
+    # write to temporary file and rename so readers never see a partial file
+    tmppath = '{}.{}.tmp'.format(filepath, getpid())
+    with open(tmppath, 'wb') as f:
+        f.write(data)
+    replace(tmppath, filepath)
+
+# ----------------------------------------------------------------------
+def write_precompressed(filepath, data=None):
+    '''
+    write compressed variants of file
+
+    :param filepath: path of original file, which must already be written
+    :param data: contents of original file, if caller has them
+    '''
+    if data is None:
+        with open(filepath, 'rb') as f:
+            data = f.read()
+    for encoding, suffix in ENCODINGS:
+        _writefile(filepath + suffix, compress(data, encoding))
+
+# ----------------------------------------------------------------------
+def write_file_precompressed(filepath, data):
+    '''
+    write file and its compressed variants
+
+    :param filepath: path of file
+    :param data: bytes to write
+    '''
+    makedirs(dirname(filepath), exist_ok=True)
+    _writefile(filepath, data)
+    write_precompressed(filepath, data)
+
+# ----------------------------------------------------------------------
+def _variant_current(filepath, suffix):
+    variantpath = filepath + suffix
+    return exists(variantpath) and stat(variantpath).st_mtime_ns >= stat(filepath).st_mtime_ns
+
+# ----------------------------------------------------------------------
+def precompressed_current(filepath):
+    '''
+    check if compressed variants of file exist and are up to date
+
+    :param filepath: path of original file
+    :rtype: boolean
+    '''
+    return all(_variant_current(filepath, suffix) for encoding, suffix in ENCODINGS)
+
+# ----------------------------------------------------------------------
+def negotiate(filepath):
+    '''
+    choose the file variant to send for the current request
+
+    :param filepath: path of original file
+    :return: (path of file to send, content-encoding or None)
+    '''
+    for encoding, suffix in ENCODINGS:
+        if encoding in request.accept_encodings and _variant_current(filepath, suffix):
+            return filepath + suffix, encoding
+    return filepath, None
+
+# ----------------------------------------------------------------------
+def precompressed_response(filepath, mimetype, **kwargs):
+    '''
+    send file, using the best compressed variant the client accepts
+
+    :param filepath: path of original file
+    :param mimetype: mimetype of original file
+    :param kwargs: additional keyword arguments for flask.send_file()
+    :return: response
+    '''
+    sendpath, encoding = negotiate(filepath)
+    response = send_file(sendpath, mimetype=mimetype, **kwargs)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+# ----------------------------------------------------------------------
+def send_static_precompressed(filename):
+    '''
+    replacement for flask's static view which serves precompressed variants
+
+    variants are never written here, so the static folder can be read only. Variants of asset bundles
+    are written by the precompress-assets command when the app is deployed, see dbupgrade_and_run.sh.
+    Until then, or if a bundle is rebuilt later, the original file is sent
+
+    :param filename: filename within static folder
+    :return: response
+    '''
+    filepath = safe_join(current_app.static_folder, filename)
+    mimetype = guess_type(filename)[0]
+    if not filepath or not isfile(filepath) or mimetype not in COMPRESSIBLE_MIMETYPES:
+        return current_app.send_static_file(filename)
+
+    return precompressed_response(filepath, mimetype, max_age=current_app.get_send_file_max_age(filename))
+
+# ----------------------------------------------------------------------
+def init_app(app):
+    '''
+    serve static files through send_static_precompressed()
+
+    :param app: flask app
+    '''
+    app.view_functions['static'] = send_static_precompressed
+
+@click.command('precompress-assets')
+def precompress_assets_command():
+    '''build asset bundles and write their compressed variants'''
+    from .assets import asset_env
+    for bundle in asset_env:
+        bundle.build()
+
+    numfiles = 0
+    genfolder = join(current_app.static_folder, ASSETS_GEN_FOLDER)
+    for filename in listdir(genfolder) if isdir(genfolder) else []:
+        filepath = join(genfolder, filename)
+        if isfile(filepath) and guess_type(filename)[0] in COMPRESSIBLE_MIMETYPES:
+            write_precompressed(filepath)
+            numfiles += 1
+    click.echo('precompressed {} asset files'.format(numfiles))
@@ -0,0 +1,133 @@
+###########################################################################################
+# queryplans - check query plans of hot queries
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+queryplans - check query plans of hot queries
+==================================================
+runs EXPLAIN on the ORM queries issued by the views, caches and crond jobs, and reports any which
+scan a whole table (or a whole index) which is larger than a threshold
+
+the queries are built by the same functions the views, caches and crond jobs use, so they can't
+drift from the queries actually issued. When a hot query is added, build it with a function in its
+module and add it here. Primary key lookups are left out, as they can't scan a table
+
+    flask check-query-plans --minrows 1000
+
+exits with status 1 if any query fails the check. Only MySQL EXPLAIN output is understood
+'''
+# standard
+from datetime import datetime, timedelta
+import sys
+
+# pypi
+import click
+
+# homegrown
+from . import app
+from .models import db, LocalInterest, Route, Location
+from .files import fidfile_query, route_files_query, gpxfile_routes_query
+from .routescache import interest_routes_query, routes_versions_query
+from .spatialindex import route_locations_query
+from .iconmapcache import iconmap_query, iconmap_versions_query, iconlocation_versions_query, iconlocations_query
+from .jobs import claimable_routejobs_query, routejob_query
+from .locations import refresh_locations_query
+from .geo import geocoderesult_select, normalize_address
+
+# EXPLAIN type for full table scan and full index scan
+FULLSCAN_TYPES = ['ALL', 'index']
+
+# ----------------------------------------------------------------------
+def hot_queries():
+    '''
+    build the hot queries, using values from the database where possible
+
+    :return: [(name, Query or Select), ...]
+    '''
+    linterest = LocalInterest.query.first()
+    linterest_id = linterest.id if linterest else 0
+    route = Route.query.first()
+    route_id = route.id if route else 0
+    gpx_file_id = route.gpx_file_id if route and route.gpx_file_id else ''
+    location = Location.query.first()
+    address = normalize_address(location.location) if location else ''
+    now = datetime.now()
+
+    return [
+        # files.py, views/admin/routes.py, views/frontend, jobs.py
+        ('files by fileid', fidfile_query(gpx_file_id)),
+        ('files by route', route_files_query(route_id)),
+        ('routes by gpx_file_id', gpxfile_routes_query(gpx_file_id)),
+
+        # routescache.py, views/frontend/frontend.py UserRoutes etag
+        ('routes by interest', interest_routes_query(linterest_id)),
+        ('route versions by interest', routes_versions_query(linterest_id)),
+
+        # spatialindex.py
+        ('route locations by interest', route_locations_query(linterest_id)),
+
+        # iconmapcache.py, views/frontend
+        ('iconmap by interest', iconmap_query(linterest_id)),
+        ('iconmap versions by interest', iconmap_versions_query(linterest_id)),
+        ('iconlocations by interest', iconlocations_query(linterest_id)),
+        ('iconlocation versions by interest', iconlocation_versions_query(linterest_id)),
+
+        # jobs.py, views/admin/routes.py RunningRoutesJob
+        ('routejob claim', claimable_routejobs_query(now)),
+        ('routejob by id', routejob_query(0, linterest_id)),
+
+        # locations.py
+        ('locations to refresh', refresh_locations_query(now - timedelta(30), 100)),
+
+        # geo.py GeocodeCache
+        ('geocoderesult by address', geocoderesult_select(address)),
+    ]
+
+# ----------------------------------------------------------------------
+def explain(query):
+    '''
+    run EXPLAIN for query
+
+    :param query: Query or Select
+    :return: [{'table', 'type', 'key', 'rows', ...}, ...], one per table accessed
+    '''
+    statement = getattr(query, 'statement', query)
+    conn = db.session.connection(bind_arguments={'clause': statement})
+    compiled = statement.compile(dialect=conn.dialect)
+    result = conn.exec_driver_sql('EXPLAIN {}'.format(compiled), compiled.params)
+    return [dict(row._mapping) for row in result]
+
+# ----------------------------------------------------------------------
+def check_query_plans(minrows):
+    '''
+    check query plans for hot queries
+
+    :param minrows: tables with more than this many rows must not be scanned
+    :return: [(name, EXPLAIN row), ...] for failing queries
+    '''
+    failures = []
+    for name, query in hot_queries():
+        for plan in explain(query):
+            fullscan = plan['type'] in FULLSCAN_TYPES and (plan['rows'] or 0) > minrows
+            app.logger.info('check_query_plans(): {}{}: table={} type={} key={} rows={}'.format(
+                'FULL SCAN ' if fullscan else '', name, plan['table'], plan['type'], plan['key'], plan['rows']))
+            if fullscan:
+                failures.append((name, plan))
+    db.session.rollback()
+    return failures
+
+@click.command('check-query-plans')
+@click.option('--minrows', default=1000, help='fail if a table with more than this many rows is fully scanned')
+def check_query_plans_command(minrows):
+    '''run EXPLAIN on hot queries, and fail if any scans a large table'''
+    failures = check_query_plans(minrows)
+    for name, plan in failures:
+        click.echo('{}: full scan of {} ({} rows)'.format(name, plan['table'], plan['rows']))
+    if failures:
+        sys.exit(1)
+    click.echo('all query plans ok')
@@ -0,0 +1,163 @@
+###########################################################################################
+# routepath - route path processing
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+routepath - route path processing
+===================================================
+calculates the path file, distance and elevation gain from an uploaded gpx or kml file
+'''
+# standard
+from os.path import join
+
+# pypi
+from googlemaps.client import Client
+import numpy
+from loutilities.geo import LatLng, GeoDistance, elevation_gain
+
+# homegrown
+from . import app
+from .files import create_fidfile
+from .pathfile import write_pathfile, PATHFILE_EXT, PATHFILE_MIMETYPE
+from .densify import get_densifier
+from .elevation import ElevationFetcher, get_elevation_provider
+from .geo import GmapsLoc, get_geocoder
+from .spatialindex import get_startindex
+
+APP_EARTH_RADIUS = app.config['APP_EARTH_RADIUS']
+geodist = GeoDistance(APP_EARTH_RADIUS)
+
+# configuration
+## note resolution is about 9.5 meters, so no need to have points
+## closer than within that radius
+ELEV_RESOLUTION = 9.5 # meters
+FT_PER_SAMPLE = 60 # feet
+MAX_SAMPLES = 512
+GMAPS_QUERIES_PER_SECOND = 50
+
+# calculated
+MI_PER_SAMPLE = FT_PER_SAMPLE / 5280.0
+SAMPLES_PER_MILE = 5280 / FT_PER_SAMPLE # int
+GELEV_MAX_MILES = MAX_SAMPLES*1.0 / SAMPLES_PER_MILE
+
+# see https://developers.google.com/maps/documentation/elevation/usage-limits
+# GMAPS_ELEV_BASE_URL may be set to point at a fake elevation server, see runningroutes.scripts.fake_elevation_server
+gmapsclient = Client(key=app.config['GMAPS_ELEV_API_KEY'],queries_per_second=GMAPS_QUERIES_PER_SECOND,
+                     base_url=app.config.get('GMAPS_ELEV_BASE_URL', 'https://maps.googleapis.com'))
+elevfetcher = ElevationFetcher(gmapsclient, maxsamples=MAX_SAMPLES,
+                               maxworkers=app.config.get('APP_ELEV_MAX_WORKERS', 4),
+                               queries_per_second=GMAPS_QUERIES_PER_SECOND, logger=app.logger)
+# APP_ELEV_PROVIDER 'google' (default) uses google elevation api
+# APP_ELEV_PROVIDER 'dem' uses local SRTM tiles from APP_DEM_FOLDER where available, falling back to google
+# point elevations are cached in APP_ELEV_CACHE_FILE, set to empty string to disable cache
+elevprovider = get_elevation_provider(app.config.get('APP_ELEV_PROVIDER', 'google'), elevfetcher,
+                                      demfolder=app.config.get('APP_DEM_FOLDER', join(app.config['APP_FILE_FOLDER'], '_dem')),
+                                      cachefile=app.config.get('APP_ELEV_CACHE_FILE', join(app.config['APP_FILE_FOLDER'], '_cache', 'elevation.sqlite')),
+                                      cacheresolution=ELEV_RESOLUTION,
+                                      logger=app.logger)
+
+# used for geocoding start locations, which may be overridden with an address
+gmaps = GmapsLoc(app.config['GMAPS_ELEV_API_KEY'], geocoder=get_geocoder(app.config))
+
+# ----------------------------------------------------------------------
+def snaploc(interest_id, loc):
+    '''
+    return "close" latlng for this loc
+
+    :param interest_id: LocalInterest id of route
+    :param loc: loc to look for
+    :rtype: 'lat,lng' (6 decimal places)
+    '''
+
+    # convert loc to (lat, lng)
+    latlng = gmaps.loc2latlng(loc)
+
+    # check if start location is "close" to any existing location. If so, snap to nearest existing location
+    epsilon = app.config['APP_ROUTE_LOC_EPSILON']/1000.0   # convert to km
+    startindex = get_startindex(interest_id, geodist, epsilon)
+    this_loc = startindex.nearest(latlng) or latlng
+
+    # normalize format to 6 decimal places
+    return ','.join(['{:.6f}'.format(l) for l in this_loc])
+
+# ----------------------------------------------------------------------
+def process_routefile(group, filepath, filename):
+    '''
+    process gpx or kml file, creating the path file
+
+    :param group: interest slug, group for path file
+    :param filepath: path of gpx or kml file
+    :param filename: original filename, file type is determined from the extension
+    :return: {'path_file_id', 'elevation_gain', 'distance', 'start_location'}
+    '''
+    filetype = filename.split('.')[-1]
+
+    # latlng processing depends on file type
+    with open(filepath, mode='rb') as routefile:
+        latlng = LatLng(routefile, filetype)
+        locations = latlng.getpoints()
+
+    # calculate distance in km, inserting points so none are farther apart than APP_MAX_DIST_INTERVAL
+    # anno is list of [cumdist, inserted], where inserted is empty or 'inserted'
+    maxinterval = app.config['APP_MAX_DIST_INTERVAL']/1000.0  # convert m to km
+    densifier = get_densifier(app.config.get('APP_DENSIFY_ENGINE', 'numpy'), geodist, maxinterval)
+    distance, locs, anno = densifier.densify(locations)
+
+    # convert to miles
+    distance /= 1.609344
+
+    # query for elevation points
+    ## local tiles are used if available, else elevfetcher slices off locations which meet max sample
+    ## requirements from google for each query and sends the queries concurrently
+    gelevs = elevprovider.elevations(locs)
+
+    # calculate elevation gain
+    elevations = numpy.array([float(p['orig_ele']) for p in gelevs])
+    upthreshold = app.config['APP_ELEV_UPTHRESHOLD']
+    downthreshold = app.config['APP_ELEV_DOWNTHRESHOLD']
+    smoothwin = app.config['APP_SMOOTHING_WINDOW']
+
+    ## first smooth the elevations using flat window
+    ## see http://scipy-cookbook.readthedocs.io/items/SignalSmooth.html
+    s = numpy.r_[elevations[smoothwin-1:0:-1],elevations,elevations[-2:-smoothwin-1:-1]]
+    w = numpy.ones(smoothwin,'d')
+    y=numpy.convolve(w/w.sum(),s,mode='valid')
+    # use floor division operator // (new in python 3)
+    smoothed = y[(smoothwin//2):-(smoothwin//2)]
+    # smoothedl = [[e] for e in smoothed]
+    # reference suggested below to
+    # smoothed = y[(smoothwin/2-1):-(smoothwin/2)]
+
+    ## calculate the gain using the smoothed elevation profile
+    gain = elevation_gain(smoothed, upthreshold=upthreshold, downthreshold=downthreshold)
+
+    # combine gelevs with anno
+    if len(gelevs) != len(anno) or len(gelevs) != len(smoothed):
+        app.logger.debug('invalid list len len(gelevs)={} len(anno)={} len(smoothed)={}'.format(len(gelevs), len(anno), len(smoothed)))
+
+    # create/write binary path file with calculated path points, see pathfile.py
+    # levels of detail for simplified paths are calculated by write_pathfile(), see simplify.py
+    npoints = len(gelevs)
+    path_fid, pathfilepath = create_fidfile(group, filename+PATHFILE_EXT, PATHFILE_MIMETYPE)
+    write_pathfile(pathfilepath,
+                   lat=[p['lat'] for p in gelevs],
+                   lng=[p['lng'] for p in gelevs],
+                   orig_ele=[p['orig_ele'] for p in gelevs],
+                   res=[p['res'] for p in gelevs],
+                   ele=[smoothed[ndx] if ndx < len(smoothed) else None for ndx in range(npoints)],
+                   cumdist_km=[anno[ndx][0] if ndx < len(anno) else None for ndx in range(npoints)],
+                   inserted=[anno[ndx][1] if ndx < len(anno) else None for ndx in range(npoints)],
+                   )
+
+    return {
+        'path_file_id' : path_fid,
+        # round for user-friendly display
+        'elevation_gain' : int(round(gain)),
+        'distance' : '{:.1f}'.format(distance),
+        'start_location' : ', '.join(['{:.6f}'.format(ll) for ll in locations[0]])
+    }
@@ -0,0 +1,197 @@
+###########################################################################################
+# routequery - bounding box, radius, distance and surface queries for routes
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+routequery - bounding box, radius, distance and surface queries for routes
+===============================================================================
+/<interest>/routes/rest accepts these query parameters, which may be combined
+
+    bbox=south,west,north,east  start within bounds, e.g., google.maps.LatLngBounds.toUrlValue()
+    near=lat,lng&radius=r       start within r miles of lat,lng
+    mindist=d, maxdist=d        route distance range, miles
+    surface=s1,s2               route surface is one of these, case insensitive
+
+the index is built from the cached FeatureCollection, see routescache.py. Start locations are kept
+sorted by latitude, so bbox and near queries only look at the routes in the query's latitude band,
+found by binary search, rather than every route of the interest. Matching features are returned in
+the same order as the full FeatureCollection
+
+each process keeps one index per interest, which is rebuilt when the cache file changes. The cache
+file name changes whenever the routes change, see routescache.py
+'''
+# standard
+from json import load
+from math import cos, radians, degrees, isfinite
+from threading import Lock
+
+# pypi
+import numpy
+
+# homegrown
+from .simplify import EARTH_RADIUS
+
+# query parameters handled here
+QUERY_ARGS = ['bbox', 'near', 'radius', 'mindist', 'maxdist', 'surface']
+
+METERS_PER_MILE = 1609.344
+
+class RouteQueryError(Exception): pass
+
+########################################################################
+class RouteQueryIndex():
+    '''
+    index of route features
+
+    :param features: features from routes FeatureCollection
+    '''
+    # ----------------------------------------------------------------------
+    def __init__(self, features):
+        self.features = features
+        properties = [f['geometry']['properties'] for f in features]
+        self.lat = numpy.array([_float(p['lat']) for p in properties])
+        self.lng = numpy.array([_float(p['lng']) for p in properties])
+        self.distance = numpy.array([_float(p['distance']) for p in properties])
+        self.surface = numpy.array([(p['surface'] or '').lower() for p in properties], dtype=object)
+
+        # routes without a start location sort to the end, and never match a location query
+        self.latorder = numpy.argsort(self.lat, kind='stable')
+        self.sortedlat = self.lat[self.latorder]
+
+    # ----------------------------------------------------------------------
+    def _latband(self, south, north):
+        # indexes of features with south <= lat <= north
+        first = numpy.searchsorted(self.sortedlat, south, side='left')
+        last = numpy.searchsorted(self.sortedlat, north, side='right')
+        return self.latorder[first:last]
+
+    # ----------------------------------------------------------------------
+    def select(self, bbox=None, near=None, radius=None, mindist=None, maxdist=None, surfaces=None):
+        '''
+        select features which match all the specified criteria
+
+        :param bbox: (south, west, north, east), degrees, west > east if bounds cross the antimeridian
+        :param near: (lat, lng), degrees, requires radius
+        :param radius: miles
+        :param mindist: minimum route distance, miles
+        :param maxdist: maximum route distance, miles
+        :param surfaces: list of surfaces
+        :return: list of matching features
+        '''
+        candidates = numpy.arange(len(self.features))
+
+        if bbox:
+            south, west, north, east = bbox
+            candidates = self._latband(south, north)
+            lng = self.lng[candidates]
+            if west <= east:
+                inlng = (lng >= west) & (lng <= east)
+            else:
+                inlng = (lng >= west) | (lng <= east)
+            candidates = candidates[inlng]
+
+        if near:
+            lat, lng = near
+            radiusm = radius * METERS_PER_MILE
+            dlat = degrees(radiusm / EARTH_RADIUS)
+            band = self._latband(lat - dlat, lat + dlat)
+            candidates = numpy.intersect1d(candidates, band, assume_unique=True) if bbox else band
+            candidates = candidates[_haversine(lat, lng, self.lat[candidates], self.lng[candidates]) <= radiusm]
+
+        # numpy comparisons with nan are False, so routes with unknown distance don't match a range
+        if mindist is not None:
+            candidates = candidates[self.distance[candidates] >= mindist]
+        if maxdist is not None:
+            candidates = candidates[self.distance[candidates] <= maxdist]
+
+        if surfaces:
+            candidates = candidates[numpy.isin(self.surface[candidates], [s.lower() for s in surfaces])]
+
+        return [self.features[i] for i in numpy.sort(candidates)]
+
+# ----------------------------------------------------------------------
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return numpy.nan
+
+# ----------------------------------------------------------------------
+def _haversine(lat, lng, lats, lngs):
+    # meters from lat, lng to each of lats, lngs
+    dlat = numpy.radians(lats - lat)
+    dlng = numpy.radians(lngs - lng)
+    a = numpy.sin(dlat / 2)**2 + cos(radians(lat)) * numpy.cos(numpy.radians(lats)) * numpy.sin(dlng / 2)**2
+    return 2 * EARTH_RADIUS * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1)))
+
+# ----------------------------------------------------------------------
+def _floats(value, count, name):
+    try:
+        floats = [float(v) for v in value.split(',')]
+    except ValueError:
+        raise RouteQueryError('{} must be numbers: {}'.format(name, value))
+    # float() accepts nan and inf
+    if not all(isfinite(f) for f in floats):
+        raise RouteQueryError('{} must be finite numbers: {}'.format(name, value))
+    if len(floats) != count:
+        raise RouteQueryError('{} must have {} values: {}'.format(name, count, value))
+    return floats
+
+# ----------------------------------------------------------------------
+def parse_query_args(args):
+    '''
+    parse route query parameters
+
+    :param args: request.args
+    :return: keyword arguments for RouteQueryIndex.select(), empty if no query parameters
+    :raises: RouteQueryError if parameters are invalid
+    '''
+    query = {}
+    if args.get('bbox'):
+        query['bbox'] = _floats(args['bbox'], 4, 'bbox')
+        if query['bbox'][0] > query['bbox'][2]:
+            raise RouteQueryError('bbox south must not be greater than north: {}'.format(args['bbox']))
+    if args.get('near'):
+        query['near'] = _floats(args['near'], 2, 'near')
+        if not args.get('radius'):
+            raise RouteQueryError('radius is required with near')
+        query['radius'] = _floats(args['radius'], 1, 'radius')[0]
+        if query['radius'] < 0:
+            raise RouteQueryError('radius must not be negative: {}'.format(args['radius']))
+    elif args.get('radius'):
+        raise RouteQueryError('near is required with radius')
+    for arg in ['mindist', 'maxdist']:
+        if args.get(arg):
+            query[arg] = _floats(args[arg], 1, arg)[0]
+    if args.get('surface'):
+        query['surfaces'] = [s.strip() for s in args['surface'].split(',') if s.strip()]
+    return query
+
+# per interest indexes, {interest_id: (cache file path, RouteQueryIndex)}
+queryindexes = {}
+queryindexes_lock = Lock()
+
+# ----------------------------------------------------------------------
+def get_queryindex(interest_id, cachefile):
+    '''
+    get query index for interest, rebuilding it if the cached FeatureCollection has changed
+
+    :param interest_id: LocalInterest id
+    :param cachefile: path of cached FeatureCollection, from routescache.get_routes_cachefile()
+    :return: RouteQueryIndex
+    '''
+    # cache file path includes the signature of the route versions it was built from
+    with queryindexes_lock:
+        cached = queryindexes.get(interest_id)
+        if cached and cached[0] == cachefile:
+            return cached[1]
+
+        with open(cachefile, 'rb') as f:
+            index = RouteQueryIndex(load(f)['features'])
+        queryindexes[interest_id] = (cachefile, index)
+        return index
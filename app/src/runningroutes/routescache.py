@@ -0,0 +1,185 @@
+###########################################################################################
+# routescache - precomputed routes FeatureCollection
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+routescache - precomputed routes FeatureCollection
+=======================================================
+the FeatureCollection returned by /<interest>/routes/rest only changes when routes are edited, so
+it is serialized once per interest, and saved as a json file in the cache folder, along with its
+compressed variants, see precompress.py
+
+the cache file name includes a signature of the (id, version_id) of the routes it was built from,
+so a file built from old routes is never served for the current routes. The cache is rebuilt by
+update_routes_cache() whenever routes are created or updated, and by get_routes_cachefile() if the
+file for the current routes doesn't exist, e.g., if a rebuild failed or routes were updated by some
+other means
+
+files for older signatures are removed after OLD_CACHEFILE_SECONDS, which gives requests which
+already have the old file's path plenty of time to open it
+'''
+# standard
+from glob import glob
+from hashlib import sha1
+from os import remove, stat
+from os.path import join, exists
+from time import time
+
+# pypi
+from flask import current_app
+
+# homegrown
+from .models import db, Route
+from .precompress import write_file_precompressed, precompressed_current
+
+OLD_CACHEFILE_SECONDS = 60
+
+# ----------------------------------------------------------------------
+def interest_routes_query(linterest_id):
+    '''
+    query for routes of interest
+
+    :param linterest_id: LocalInterest id
+    :return: Query
+    '''
+    return Route.query.filter_by(interest_id=linterest_id).order_by(Route.id)
+
+# ----------------------------------------------------------------------
+def routes_versions_query(linterest_id):
+    '''
+    query for versions of routes of interest
+
+    :param linterest_id: LocalInterest id
+    :return: Query
+    '''
+    return db.session.query(Route.id, Route.version_id).filter_by(interest_id=linterest_id).order_by(Route.id)
+
+# ----------------------------------------------------------------------
+def routes_versions(linterest_id):
+    '''
+    versions of the routes which go into the FeatureCollection
+
+    :param linterest_id: LocalInterest id
+    :return: [(id, version_id), ...] ordered by id
+    '''
+    return [tuple(v) for v in routes_versions_query(linterest_id).all()]
+
+# ----------------------------------------------------------------------
+def routes_featurecollection(routes):
+    '''
+    build FeatureCollection for active routes
+
+    :param routes: list of Route for interest
+    :return: FeatureCollection dict
+    '''
+    # this is a bit goofy but is trying to use googles geo FeatureCollection
+    geo = {
+        'type': 'FeatureCollection',
+        'features': [],
+    }
+
+    # add points from database
+    for route in routes:
+        # skip inactive routes
+        if not route.active: continue
+
+        lat, lng = route.latlng.split(',')
+
+        thisgeo = {
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [lat, lng],
+                'properties': {
+                                'id': route.id,
+                                'name': route.name,
+                                'distance': route.distance,
+                                'surface': route.surface,
+                                'gain': route.elevation_gain,
+                                'links': '', # placeholder - built on the client
+                                'description': route.description,
+                                'lat': lat,
+                                'lng': lng,
+                                'start': route.start_location,
+                                'latlng': route.latlng,
+                                'map': route.map,
+                                'fileid': route.gpx_file_id,
+                }
+            }
+        }
+        geo['features'].append(thisgeo)
+
+    # case insensitive string sort by name field
+    geo['features'].sort(key=lambda item: item['geometry']['properties']['name'].lower())
+    return geo
+
+# ----------------------------------------------------------------------
+def _cachefolder():
+    return current_app.config.get('APP_ROUTES_CACHE_FOLDER', join(current_app.config['APP_FILE_FOLDER'], '_cache'))
+
+# ----------------------------------------------------------------------
+def routes_cachefile(linterest, versions):
+    '''
+    return path of cache file for interest
+
+    :param linterest: LocalInterest
+    :param versions: routes_versions() of the routes in the file
+    :return: filepath
+    '''
+    signature = sha1(repr(list(versions)).encode('utf-8')).hexdigest()
+    return join(_cachefolder(), 'routes-{}-{}.json'.format(linterest.id, signature))
+
+# ----------------------------------------------------------------------
+def _remove_old_cachefiles(linterest, filepath):
+    # also picks up compressed variants, and files from before signatures were used
+    oldest = time() - OLD_CACHEFILE_SECONDS
+    for oldpath in glob(join(_cachefolder(), 'routes-{}[-.]*'.format(linterest.id))):
+        if oldpath.startswith(filepath):
+            continue
+        try:
+            if stat(oldpath).st_mtime < oldest:
+                remove(oldpath)
+        # another process got there first
+        except FileNotFoundError:
+            pass
+
+# ----------------------------------------------------------------------
+def update_routes_cache(linterest):
+    '''
+    rebuild cached FeatureCollection for interest
+
+    caller must have committed route updates
+
+    :param linterest: LocalInterest
+    :return: filepath of serialized FeatureCollection
+    '''
+    routes = interest_routes_query(linterest.id).all()
+    # signature comes from the same rows as the content
+    filepath = routes_cachefile(linterest, [(route.id, route.version_id) for route in routes])
+
+    # serialize the same way jsonify() does
+    data = current_app.json.dumps(routes_featurecollection(routes)).encode('utf-8')
+    write_file_precompressed(filepath, data)
+    _remove_old_cachefiles(linterest, filepath)
+    return filepath
+
+# ----------------------------------------------------------------------
+def get_routes_cachefile(linterest, versions=None):
+    '''
+    get path of cached FeatureCollection for interest, building it if needed
+
+    :param linterest: LocalInterest
+    :param versions: routes_versions(linterest.id) if caller already has them
+    :return: filepath of serialized FeatureCollection, see precompress.precompressed_response()
+    '''
+    if versions is None:
+        versions = routes_versions(linterest.id)
+    filepath = routes_cachefile(linterest, versions)
+    if not exists(filepath) or not precompressed_current(filepath):
+        filepath = update_routes_cache(linterest)
+    return filepath
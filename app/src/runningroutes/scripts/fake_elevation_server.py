@@ -0,0 +1,104 @@
+###########################################################################################
+# fake_elevation_server - local stand-in for google elevation api
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+fake_elevation_server - local stand-in for google elevation api
+=======================================================================
+run from 2 levels up, like python -m runningroutes.scripts.fake_elevation_server --port 8099 --delay 0.5
+
+set GMAPS_ELEV_BASE_URL = 'http://localhost:8099' in the app configuration to use this instead of
+google. Elevations are a smooth function of lat, lng so results are repeatable, and each request
+is delayed by --delay seconds to simulate network latency
+'''
+# standard
+from argparse import ArgumentParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from json import dumps
+from math import sin, cos, radians
+from time import sleep
+from urllib.parse import urlparse, parse_qs
+
+# pypi
+from googlemaps.convert import decode_polyline
+
+ELEVATION_PATH = '/maps/api/elevation/json'
+RESOLUTION = 9.543951
+
+# ----------------------------------------------------------------------
+def fake_elevation(lat, lng):
+    '''
+    repeatable elevation for a point
+
+    :param lat: latitude, degrees
+    :param lng: longitude, degrees
+    :return: elevation, meters
+    '''
+    return 100.0 + 50.0 * sin(radians(lat) * 500) * cos(radians(lng) * 500)
+
+# ----------------------------------------------------------------------
+def parse_locations(locations):
+    '''
+    parse locations parameter as sent by googlemaps.elevation.elevation()
+
+    :param locations: 'enc:<polyline>' or 'lat,lng|lat,lng|...'
+    :return: list of (lat, lng)
+    '''
+    if locations.startswith('enc:'):
+        return [(p['lat'], p['lng']) for p in decode_polyline(locations[4:])]
+    return [tuple(float(v) for v in loc.split(',')) for loc in locations.split('|')]
+
+########################################################################
+class FakeElevationHandler(BaseHTTPRequestHandler):
+    # set by main()
+    delay = 0
+
+    # ----------------------------------------------------------------------
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != ELEVATION_PATH:
+            self.send_error(404)
+            return
+
+        query = parse_qs(url.query)
+        if 'locations' not in query:
+            body = {'results': [], 'status': 'INVALID_REQUEST'}
+        else:
+            points = parse_locations(query['locations'][0])
+            body = {
+                'results': [{'elevation': fake_elevation(lat, lng),
+                             'location': {'lat': lat, 'lng': lng},
+                             'resolution': RESOLUTION} for lat, lng in points],
+                'status': 'OK',
+            }
+
+        if self.delay:
+            sleep(self.delay)
+
+        content = dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+# ----------------------------------------------------------------------
+def main():
+    parser = ArgumentParser(description='local stand-in for google elevation api')
+    parser.add_argument('--host', default='localhost', help='host to listen on, default %(default)s')
+    parser.add_argument('--port', type=int, default=8099, help='port to listen on, default %(default)s')
+    parser.add_argument('--delay', type=float, default=0, help='seconds to delay each response, default %(default)s')
+    args = parser.parse_args()
+
+    FakeElevationHandler.delay = args.delay
+    server = ThreadingHTTPServer((args.host, args.port), FakeElevationHandler)
+    print('fake elevation server listening on http://{}:{}'.format(args.host, args.port))
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+###########################################################################################
+# simplify - route path levels of detail
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+simplify - route path levels of detail
+===========================================
+the densified path has a point every few meters, far more than the map or elevation chart can show
+at typical zoom. Each point is given a level of detail (lod), the coarsest level at which the point
+is still needed, so level L of the path is the points with lod >= L. Level 0 is every point
+
+a point is needed at a level if Douglas-Peucker simplification of the horizontal path, or of the
+elevation profile (elevation vs. distance), would keep it at that level's tolerance. Douglas-Peucker
+significance is computed once for each point, so all the levels come from a single pass. The first
+and last points are in every level
+'''
+# standard
+from math import cos, radians
+
+# pypi
+import numpy
+
+# (horizontal tolerance, elevation tolerance) in meters for each level, level 0 keeps all points
+LOD_TOLERANCES = [
+    (0, 0),
+    (1, 0.5),
+    (2, 1),
+    (5, 1.5),
+    (10, 2),
+    (20, 3),
+    (50, 5),
+    (100, 10),
+]
+LOD_MAX = len(LOD_TOLERANCES) - 1
+
+# meters, for local projection of lat, lng
+EARTH_RADIUS = 6371008.8
+
+# meters per pixel at the equator for map zoom level 0 (web mercator, 256 pixel tiles)
+ZOOM0_METERS_PER_PIXEL = 156543.03392
+
+# ----------------------------------------------------------------------
+def dp_significance(x, y):
+    '''
+    Douglas-Peucker significance of each point
+
+    a point is kept by Douglas-Peucker simplification with tolerance t if its significance is > t
+
+    :param x: numpy array of x coordinates
+    :param y: numpy array of y coordinates, same units as x
+    :return: numpy array of significance, inf for the end points
+    '''
+    npoints = len(x)
+    significance = numpy.zeros(npoints)
+    if npoints == 0:
+        return significance
+    significance[0] = significance[-1] = numpy.inf
+
+    # iterate rather than recurse, paths can be long
+    stack = [(0, npoints-1, numpy.inf)]
+    while stack:
+        first, last, parent = stack.pop()
+        if last - first < 2:
+            continue
+
+        # distance of intermediate points from segment first-last
+        segx, segy = x[last] - x[first], y[last] - y[first]
+        ptx, pty = x[first+1:last] - x[first], y[first+1:last] - y[first]
+        seglen2 = segx*segx + segy*segy
+        if seglen2 > 0:
+            t = numpy.clip((ptx*segx + pty*segy) / seglen2, 0, 1)
+        else:
+            t = 0
+        dist = numpy.hypot(ptx - t*segx, pty - t*segy)
+
+        ndx = int(numpy.argmax(dist))
+        split = first + 1 + ndx
+        # a point can't be more significant than the point which split its segment
+        thissig = min(dist[ndx], parent)
+        significance[split] = thissig
+        stack.append((first, split, thissig))
+        stack.append((split, last, thissig))
+
+    return significance
+
+# ----------------------------------------------------------------------
+def _fillnan(values):
+    values = numpy.asarray(values, dtype=float)
+    valid = ~numpy.isnan(values)
+    if valid.all() or not valid.any():
+        return numpy.nan_to_num(values)
+    ndx = numpy.arange(len(values))
+    return numpy.interp(ndx, ndx[valid], values[valid])
+
+# ----------------------------------------------------------------------
+def path_lod(lat, lng, ele, cumdist_km):
+    '''
+    level of detail for each point on path
+
+    :param lat: array-like of latitude, degrees
+    :param lng: array-like of longitude, degrees
+    :param ele: array-like of elevation, meters (nan or None if unknown)
+    :param cumdist_km: array-like of cumulative distance, km (nan or None if unknown)
+    :return: numpy uint8 array of lod, 0 to LOD_MAX
+    '''
+    lat = _fillnan([numpy.nan if v is None else v for v in lat])
+    lng = _fillnan([numpy.nan if v is None else v for v in lng])
+    ele = _fillnan([numpy.nan if v is None else v for v in ele])
+    cumdist = _fillnan([numpy.nan if v is None else v for v in cumdist_km]) * 1000
+
+    lod = numpy.zeros(len(lat), dtype=numpy.uint8)
+    if len(lat) == 0:
+        return lod
+
+    # local equirectangular projection is plenty accurate over the length of a route
+    coslat = cos(radians(lat[0]))
+    x = numpy.radians(lng - lng[0]) * coslat * EARTH_RADIUS
+    y = numpy.radians(lat - lat[0]) * EARTH_RADIUS
+    horizontal = dp_significance(x, y)
+    elevation = dp_significance(cumdist, ele)
+
+    # levels nest because tolerances increase, so each level overwrites the previous one
+    for level in range(1, LOD_MAX+1):
+        htol, etol = LOD_TOLERANCES[level]
+        lod[(horizontal > htol) | (elevation > etol)] = level
+    return lod
+
+# ----------------------------------------------------------------------
+def lod_for_zoom(zoom, lat):
+    '''
+    coarsest level whose horizontal error is less than a pixel at map zoom level
+
+    :param zoom: map zoom level
+    :param lat: latitude of route, degrees
+    :return: level
+    '''
+    meters_per_pixel = ZOOM0_METERS_PER_PIXEL * cos(radians(lat)) / 2**zoom
+    level = 0
+    for thislevel, (htol, etol) in enumerate(LOD_TOLERANCES):
+        if htol <= meters_per_pixel:
+            level = thislevel
+    return level
+
+# ----------------------------------------------------------------------
+def lod_for_maxpoints(lod, maxpoints):
+    '''
+    finest level which has no more than maxpoints points
+
+    :param lod: lod array for path
+    :param maxpoints: maximum number of points
+    :return: level, LOD_MAX if no level is small enough
+    '''
+    counts = numpy.bincount(lod, minlength=LOD_MAX+1)
+    # number of points in each level is number of points with lod >= level
+    levelpoints = numpy.cumsum(counts[::-1])[::-1]
+    for level in range(LOD_MAX+1):
+        if levelpoints[level] <= maxpoints:
+            return level
+    return LOD_MAX
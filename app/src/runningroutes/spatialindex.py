@@ -0,0 +1,176 @@
+###########################################################################################
+# spatialindex - spatial index of route start locations
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+spatialindex - spatial index of route start locations
+==========================================================
+start locations are converted to points on the unit sphere and bucketed into a 3d grid whose cells
+are as large as the snapping radius, so any location within the radius of a query point is in the
+query point's cell or one of the 26 neighboring cells. Using the unit sphere rather than lat, lng
+keeps the cells the same size at any latitude
+
+each process keeps one index per interest. The index is built from the routes table when first used,
+and kept in sync by the route writes in this process, see update_startindex() and
+remove_startindex(). Routes written by other processes are picked up when the index is rebuilt, after
+APP_STARTINDEX_MAXAGE seconds
+'''
+# standard
+from collections import defaultdict
+from itertools import product
+from math import radians, sin, cos, floor
+from threading import Lock
+from time import monotonic
+
+# pypi
+from flask import current_app
+
+# homegrown
+from .models import db, Route
+
+########################################################################
+class StartLocationIndex():
+    '''
+    grid index of start locations
+
+    :param geodist: loutilities.geo.GeoDistance instance
+    :param radius: snapping radius, km
+    '''
+    # ----------------------------------------------------------------------
+    def __init__(self, geodist, radius):
+        self.geodist = geodist
+        self.radius = radius
+        # chord length on the unit sphere for radius, with a little margin for rounding
+        self.cellsize = max(2 * sin(radius / (2 * geodist.R)), 1e-9) * 1.001
+        # {cell: {route_id: [lat, lng]}}
+        self.cells = defaultdict(dict)
+        # {route_id: cell}
+        self.routecells = {}
+
+    # ----------------------------------------------------------------------
+    def _cell(self, latlng):
+        lat, lng = radians(latlng[0]), radians(latlng[1])
+        xyz = (cos(lat) * cos(lng), cos(lat) * sin(lng), sin(lat))
+        return tuple(floor(c / self.cellsize) for c in xyz)
+
+    # ----------------------------------------------------------------------
+    def add(self, route_id, latlng):
+        '''
+        add or move route's location in index
+
+        :param route_id: Route id
+        :param latlng: [lat, lng]
+        '''
+        self.remove(route_id)
+        cell = self._cell(latlng)
+        self.cells[cell][route_id] = list(latlng)
+        self.routecells[route_id] = cell
+
+    # ----------------------------------------------------------------------
+    def remove(self, route_id):
+        '''
+        remove route's location from index, if present
+
+        :param route_id: Route id
+        '''
+        cell = self.routecells.pop(route_id, None)
+        if cell is not None:
+            del self.cells[cell][route_id]
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+    # ----------------------------------------------------------------------
+    def nearest(self, latlng):
+        '''
+        find nearest indexed location within radius
+
+        :param latlng: [lat, lng]
+        :return: [lat, lng] of nearest location, or None if none are within radius
+        '''
+        cx, cy, cz = self._cell(latlng)
+        nearest = None
+        nearestdist = self.radius
+        for dx, dy, dz in product((-1, 0, 1), repeat=3):
+            # copy, as routes may be written by other threads
+            for loc in list(self.cells.get((cx + dx, cy + dy, cz + dz), {}).values()):
+                # haversineDistance returns km
+                dist = self.geodist.haversineDistance(latlng, loc, False)
+                if dist <= nearestdist:
+                    nearest = loc
+                    nearestdist = dist
+        return nearest
+
+# per interest indexes, {interest_id: (build time, StartLocationIndex)}
+startindexes = {}
+startindexes_lock = Lock()
+
+# ----------------------------------------------------------------------
+def _parse_latlng(latlng):
+    return [float(v) for v in latlng.split(',')]
+
+# ----------------------------------------------------------------------
+def route_locations_query(interest_id):
+    '''
+    query for locations of routes of interest
+
+    :param interest_id: LocalInterest id
+    :return: Query
+    '''
+    return db.session.query(Route.id, Route.latlng).filter(Route.interest_id == interest_id)
+
+# ----------------------------------------------------------------------
+def get_startindex(interest_id, geodist, radius):
+    '''
+    get start location index for interest, building it if not built yet, or older than
+    APP_STARTINDEX_MAXAGE
+
+    :param interest_id: LocalInterest id
+    :param geodist: loutilities.geo.GeoDistance instance
+    :param radius: snapping radius, km
+    :return: StartLocationIndex
+    '''
+    maxage = current_app.config.get('APP_STARTINDEX_MAXAGE', 300)
+    with startindexes_lock:
+        cached = startindexes.get(interest_id)
+        if cached and cached[1].radius == radius and monotonic() - cached[0] < maxage:
+            return cached[1]
+
+        index = StartLocationIndex(geodist, radius)
+        for route_id, latlng in route_locations_query(interest_id).all():
+            if latlng:
+                index.add(route_id, _parse_latlng(latlng))
+        startindexes[interest_id] = (monotonic(), index)
+        return index
+
+# ----------------------------------------------------------------------
+def update_startindex(interest_id, route_id, latlng):
+    '''
+    update route's location in interest's index, if the index has been built
+
+    :param interest_id: LocalInterest id
+    :param route_id: Route id
+    :param latlng: 'lat,lng', or empty if route has no location
+    '''
+    with startindexes_lock:
+        cached = startindexes.get(interest_id)
+        if not cached:
+            return
+        if latlng:
+            cached[1].add(route_id, _parse_latlng(latlng))
+        else:
+            cached[1].remove(route_id)
+
+# ----------------------------------------------------------------------
+def remove_startindex(interest_id, route_id):
+    '''
+    remove route from interest's index, if the index has been built
+
+    :param interest_id: LocalInterest id
+    :param route_id: Route id
+    '''
+    update_startindex(interest_id, route_id, None)
@@ -63,13 +63,41 @@ if ( location.pathname.includes('/routetable') ) {
         // handle editor substitution before submitting
         register_group_for_editor('interest', '#metanav-select-interest' );
 
-        editor.on('uploadXhrSuccess', function (e, fieldName, json) {
+        function set_calculated_fields(json) {
             console.log('elev = ' + json.elevation_gain + ' distance = ' + json.distance);
             editor.field('elev').set(json.elevation_gain);
             editor.field('distance').set(json.distance);
-            editor.field('active').set(json.active);
             editor.field('location').set(json.start_location);
             editor.field('path_file_id').set(json.path_file_id);
+        }
+
+        // gpx file is processed by background job, poll until the job is done
+        function poll_routejob(jobid) {
+            var group = $('#metanav-select-interest').val();
+            $.getJSON('/admin/' + group + '/routejob/' + jobid, function (json) {
+                if (json.status == 'done') {
+                    editor.field('gpx_file_id').message('');
+                    set_calculated_fields(json);
+                } else if (json.status == 'failed') {
+                    editor.field('gpx_file_id').message('');
+                    editor.field('gpx_file_id').error('error processing file, please check file and try again');
+                } else {
+                    setTimeout(function () { poll_routejob(jobid); }, 2000);
+                }
+            }).fail(function () {
+                editor.field('gpx_file_id').message('');
+                editor.field('gpx_file_id').error('error checking file processing status, please try again');
+            });
+        }
+
+        editor.on('uploadXhrSuccess', function (e, fieldName, json) {
+            editor.field('active').set(json.active);
+            if (json.job_id) {
+                editor.field('gpx_file_id').message('calculating distance and elevation gain...');
+                poll_routejob(json.job_id);
+            } else {
+                set_calculated_fields(json);
+            }
         });
 
         editor.on('initCreate', function () {
@@ -51,7 +51,8 @@ $(document).ready(function() {
     var progresslabel = $(".progress-label");
 
     // get data. rrouteurl has current id built in
-    $.getJSON(rrrouteurl+"/rest", function (data) {
+    // a few points per pixel of map width is plenty for the map and elevation chart
+    $.getJSON(rrrouteurl+"/rest", {maxpoints: Math.max(500, Math.round(3 * mapwidth))}, function (data) {
         progress.progressbar("destroy");
         progresslabel.hide();
 
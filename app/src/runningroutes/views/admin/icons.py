@@ -10,12 +10,12 @@
 
 # standard
 from copy import deepcopy
+from xml.etree.ElementTree import ParseError
 
 # pypi
 from flask import g, request, render_template
 from flask_security import current_user, auth_required
 from loutilities.tables import CrudFiles, DbCrudApiRolePermissions, get_request_action, get_request_data
-from loutilities.user.model import Interest, Role
 
 # homegrown
 from . import bp
@@ -23,10 +23,13 @@ from ... import app
 from ...models import db, Files, IconMap, Icon, IconSubtype, IconLocation, Route, Location
 from ...models import ICON_FILE_ROUTE
 from ...files import create_fidfile
-from ...models import ROLE_SUPER_ADMIN, ROLE_ICON_ADMIN
-from ...geo import GmapsLoc
+from ...icongeometry import update_icon_geometry
+from ...iconmapcache import update_iconmap_cache
+from ...models import ROLE_ICON_ADMIN
+from ...geo import GmapsLoc, get_geocoder
 from ...locations import get_location, location_validate
-from ...helpers import localinterest, common2local_interest
+from ...helpers import localinterest, get_interest, common2local_interest
+from ...permissions import has_role_permission
 from ...version import __docversion__
 
 adminguide = f'https://runningroutes.readthedocs.io/en/{__docversion__}/admin-guide.html'
@@ -34,7 +37,7 @@ adminguide = f'https://runningroutes.readthedocs.io/en/{__docversion__}/admin-gu
 debug = False
 
 # set up for google maps location management
-gmaps = GmapsLoc(app.config['GMAPS_ELEV_API_KEY'])
+gmaps = GmapsLoc(app.config['GMAPS_ELEV_API_KEY'], geocoder=get_geocoder(app.config))
 
 #######################################################################
 class IconsCrud(DbCrudApiRolePermissions):
@@ -55,27 +58,14 @@ class IconsCrud(DbCrudApiRolePermissions):
 
         # g.interest initialized in runningroutes.create_app.pull_interest
         # g.interest contains slug, pull in interest db entry. If not found, no permission granted
-        self.interest = Interest.query.filter_by(interest=g.interest).one_or_none()
+        self.interest = get_interest(g.interest)
 
         # If no interest was found, no permission granted
         if not self.interest:
             return False
 
-        # is someone logged in with ROLE_SUPER_ADMIN role? They're good
-        superadmin = Role.query.filter_by(name=ROLE_SUPER_ADMIN).one()
-        if superadmin in current_user.roles:
-            return True
-
-        # if they're not logged in with ROLE_ICON_ADMIN role, they're bad
-        iconadmin = Role.query.filter_by(name=ROLE_ICON_ADMIN).one()
-        if not iconadmin in current_user.roles:
-            return False
-
-        # current_user has ROLE_ICON_ADMIN. Can this user access current interest?
-        if self.interest in current_user.interests:
-            return True
-        else:
-            return False
+        # roles and interests are resolved once per request, see permissions.py
+        return has_role_permission(self.interest, ROLE_ICON_ADMIN)
 
     # ----------------------------------------------------------------------
     def beforequery(self):
@@ -138,6 +128,16 @@ class IconsCrud(DbCrudApiRolePermissions):
 
         return row
 
+    # ----------------------------------------------------------------------
+    def editor_method_postcommit(self, form):
+        '''
+        recompile the icon map page payload after any change has been committed
+
+        :param form: form from editor
+        :return: None
+        '''
+        update_iconmap_cache(localinterest().id)
+
     # ----------------------------------------------------------------------
     def render_template(self, **kwargs):
         '''
@@ -205,6 +205,7 @@ class IconLocationCrud(IconsCrud):
                 db.session.delete(locrec)
                 locrec_id = None
 
+        # geocode new or changed location now, so it shows on the public map right away
         locameta = gmaps.get_location(location, locrec_id, app.config['GMAPS_CACHE_LIMIT'])
         thisiconloc.location_id = locameta['id']
         # _responsedata is list, will have a single item
@@ -254,6 +255,12 @@ class IconsFiles(CrudFiles):
         thisfile.save(filepath)
         thisfile.seek(0)
 
+        # parse svg once here, so the icon map doesn't have to
+        try:
+            update_icon_geometry(icon_fid)
+        except (ParseError, TypeError, ValueError):
+            app.logger.warning('IconsFiles.upload(): could not parse svg file {}'.format(thisfile.filename))
+
         return {
             'upload' : {'id': icon_fid },
             'files' : {
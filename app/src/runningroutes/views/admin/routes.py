@@ -10,54 +10,34 @@
 
 # standard
 from copy import deepcopy
-from csv import DictWriter
 
 # pypi
-from flask import g, render_template, redirect, request, url_for, current_app
+from flask import g, render_template, redirect, request, url_for, current_app, jsonify, abort
 from flask.views import MethodView
 from flask_security import auth_required
 from flask_security import current_user
 
 # from apiclient import discovery # google api
 # from apiclient.errors import HttpError
-from googlemaps.client import Client
-from googlemaps.elevation import elevation_along_path, elevation
-import numpy
 from loutilities.tables import CrudFiles, _uploadmethod, DbCrudApiRolePermissions
-from loutilities.geo import LatLng, GeoDistance, elevation_gain, calculateBearing
-from loutilities.user.model import Interest, Role
 
 # homegrown
 from . import bp
-from ...files import create_fidfile
+from ...files import create_fidfile, fidfile_query, route_files_query
+from ...routepath import process_routefile, snaploc
+from ...jobs import enqueue_routejob, routejob_response, routejob_query
+from ...routescache import update_routes_cache
+from ...spatialindex import update_startindex, remove_startindex
+from ...helpers import localinterest, get_interest, common2local_interest
+from ...permissions import has_role_permission
 from ... import app
-from ...geo import GmapsLoc
-from ...models import LocalInterest, db, Route, Files, ROLE_SUPER_ADMIN, ROLE_ROUTES_ADMIN
+from ...models import db, Route, Files, ROLE_ROUTES_ADMIN
 from ...version import __docversion__
 
 adminguide = f'https://runningroutes.readthedocs.io/en/{__docversion__}/admin-guide.html'
 
-APP_EARTH_RADIUS = app.config['APP_EARTH_RADIUS']
-geodist = GeoDistance(APP_EARTH_RADIUS)
-
 debug = False
 
-# see https://developers.google.com/maps/documentation/elevation/usage-limits
-# also used for google maps geocoding
-gmapsclient = Client(key=app.config['GMAPS_ELEV_API_KEY'],queries_per_second=50)
-gmaps = GmapsLoc(app.config['GMAPS_ELEV_API_KEY'])
-
-# configuration
-## note resolution is about 9.5 meters, so no need to have points
-## closer than within that radius
-FT_PER_SAMPLE = 60 # feet
-MAX_SAMPLES = 512
-
-# calculated
-MI_PER_SAMPLE = FT_PER_SAMPLE / 5280.0
-SAMPLES_PER_MILE = 5280 / FT_PER_SAMPLE # int
-GELEV_MAX_MILES = MAX_SAMPLES*1.0 / SAMPLES_PER_MILE
-
 class GoogleApiError(Exception): pass
 class IdNotFound(Exception): pass
 
@@ -118,28 +98,15 @@ class RunningRoutesTable(DbCrudApiRolePermissions):
 
         # g.interest initialized in runningroutes.create_app.pull_interest
         # g.interest contains slug, pull in interest db entry. If not found, no permission granted
-        self.interest = Interest.query.filter_by(interest=g.interest).one_or_none()
+        self.interest = get_interest(g.interest)
         if not self.interest:
             return False
         else:
-            self.linterest = LocalInterest.query.filter_by(interest_id=self.interest.id).one()
-
-        # is someone logged in with ROLE_SUPER_ADMIN role? They're good
-        superadmin = Role.query.filter_by(name=ROLE_SUPER_ADMIN).one()
-        if superadmin in current_user.roles:
-            return True
+            self.linterest = common2local_interest(self.interest)
 
-        # if they're not logged in with ROLE_ROUTES_ADMIN role, they're bad
-        routesadmin = Role.query.filter_by(name=ROLE_ROUTES_ADMIN).one()
-        if not routesadmin in current_user.roles:
-            return False
+        # roles and interests are resolved once per request, see permissions.py
+        return has_role_permission(self.interest, ROLE_ROUTES_ADMIN)
 
-        # current_user has ROLE_ROUTES_ADMIN. Can this user access current interest?
-        if self.interest in current_user.interests:
-            return True
-        else:
-            return False
-        
     #----------------------------------------------------------------------
     def beforequery(self):
         '''
@@ -160,12 +127,15 @@ class RunningRoutesTable(DbCrudApiRolePermissions):
         :return: None
         '''
         # remove old files
-        oldfiles = Files.query.filter_by(route_id=route_id).all()
+        oldfiles = route_files_query(route_id).all()
         for file in oldfiles:
             file.route_id = None
 
         for fileid in fileidlist:
-            file = Files.query.filter_by(fileid=fileid).one()
+            # path file may not be available yet if route job hasn't finished
+            if not fileid:
+                continue
+            file = fidfile_query(fileid).one()
             file.route_id = route_id
 
     #----------------------------------------------------------------------
@@ -188,6 +158,7 @@ class RunningRoutesTable(DbCrudApiRolePermissions):
         # return the row
         route =  super(RunningRoutesTable, self).createrow(formdata)
         self.set_files_route(route['rowid'], [route['gpx_file_id'], route['path_file_id']])
+        update_startindex(self.linterest.id, route['rowid'], route['latlng'])
 
         return route
 
@@ -207,9 +178,35 @@ class RunningRoutesTable(DbCrudApiRolePermissions):
         
         route = super(RunningRoutesTable, self).updaterow(thisid, formdata)
         self.set_files_route(route['rowid'], [route['gpx_file_id'], route['path_file_id']])
+        update_startindex(self.linterest.id, route['rowid'], route['latlng'])
+
+        return route
+
+    #----------------------------------------------------------------------
+    def deleterow(self, thisid):
+        '''
+        deletes row in database
+
+        :param thisid: id of row to be deleted
+        :rtype: returned row for rendering, e.g., from DataTablesEditor.get_response_data()
+        '''
+        if debug: print('RunningRoutesTable.deleterow()')
+
+        # files must no longer point at the route when it is deleted
+        self.set_files_route(int(thisid))
+        self.db.session.flush()
+        route = super(RunningRoutesTable, self).deleterow(thisid)
+        remove_startindex(self.linterest.id, int(thisid))
 
         return route
 
+    #----------------------------------------------------------------------
+    def editor_method_postcommit(self, form):
+        '''
+        rebuild routes FeatureCollection after routes are created or updated
+        '''
+        update_routes_cache(self.linterest)
+
     #----------------------------------------------------------------------
     def snaploc(self, loc):
         '''
@@ -219,24 +216,8 @@ class RunningRoutesTable(DbCrudApiRolePermissions):
         :rtype: 'lat,lng' (6 decimal places)
         '''
 
-        # convert loc to (lat, lng)
-        latlng = gmaps.loc2latlng(loc)
-
-        # retrieve lat,lng data already saved; self.queryparams filters by interest
-        route_rows = Route.query.filter_by(**self.queryparams).all()
-        start_locs = [[float(v) for v in r.latlng.split(',')] for r in route_rows]
-
-        # check if start location is "close" to any existing location. If so, snap to existing location
-        epsilon = app.config['APP_ROUTE_LOC_EPSILON']/1000.0   # convert to km
-        this_loc = latlng
-        for start_loc in start_locs:
-            # haversineDistance returns km
-            if geodist.haversineDistance(this_loc, start_loc, False) <= epsilon:
-                this_loc = start_loc
-                break
-
-        # normalize format to 6 decimal places
-        return ','.join(['{:.6f}'.format(l) for l in this_loc])
+        # shared with route job worker, see jobs.py
+        return snaploc(self.linterest.id, loc)
 
     #----------------------------------------------------------------------
     def render_template(self, **kwargs):
@@ -279,120 +260,8 @@ class RunningRoutesFiles(CrudFiles):
         thisfile = request.files['upload']
         gpx_fid, filepath = create_fidfile(g.interest, thisfile.filename, thisfile.mimetype)
         thisfile.save(filepath)
-        thisfile.seek(0)
-
-        # process file data; update route with calculated values
-        # open file
-        # process file contents
-        filename = thisfile.filename
-        filetype = filename.split('.')[-1]
-
-        # latlng processing depends on file type
-        latlng = LatLng(thisfile, filetype)
-        locations = latlng.getpoints()
-
-        # calculate distance in km
-        distance = 0.0
-        maxinterval = app.config['APP_MAX_DIST_INTERVAL']/1000.0  # convert m to km
-        locs = [locations[0]]
-        # anno is list of [cumdist, inserted], where inserted is empty or 'inserted'
-        anno = [[0, '']]
-        for i in range(1,len(locations)):
-            thisdist = geodist.haversineDistance(locations[i-1], locations[i], False)
-            eachdist = thisdist
-            # add additional points if the distance between these is longer than allowed
-            if thisdist > maxinterval:
-                numnew = int(thisdist / maxinterval)
-                eachdist = thisdist / (numnew+1)
-                bearing = calculateBearing(locations[i-1], locations[i])
-                lastcoord = locations[i-1]
-                for j in range(numnew):
-                    distance += eachdist
-                    anno.append([distance, 'inserted'])
-                    # getDestinationLatLng expects distance in meters
-                    newcoord = geodist.getDestinationLatLng(lastcoord, bearing, eachdist*1000)
-                    locs.append(newcoord)
-                    lastcoord = newcoord
-            distance += eachdist
-            anno.append([distance, ''])
-            locs.append(locations[i])
-
-        # convert to miles
-        distance /= 1.609344
-
-        # query for elevation points
-        ## slice off locations which meet max sample requirements from google for each query
-        pathlen = MAX_SAMPLES
-        gelevs = []
-        while len(locs) > 0:
-            if debug: print('len(locs) = {}'.format(len(locs)))
-
-            theselocs = locs[:pathlen]
-            del locs[:pathlen]
-
-            ## get this set of elevations
-            elev = elevation(gmapsclient, theselocs)
-            # keys need to match Path fields
-            gelevs += [{'lat':p['location']['lat'], 'lng':p['location']['lng'], 'orig_ele':p['elevation'], 'res':p['resolution']} for p in elev]
-
-        # calculate elevation gain
-        elevations = numpy.array([float(p['orig_ele']) for p in gelevs])
-        upthreshold = current_app.config['APP_ELEV_UPTHRESHOLD']
-        downthreshold = current_app.config['APP_ELEV_DOWNTHRESHOLD']
-        smoothwin = current_app.config['APP_SMOOTHING_WINDOW']
-
-        ## first smooth the elevations using flat window
-        ## see http://scipy-cookbook.readthedocs.io/items/SignalSmooth.html
-        s = numpy.r_[elevations[smoothwin-1:0:-1],elevations,elevations[-2:-smoothwin-1:-1]]
-        w = numpy.ones(smoothwin,'d')
-        y=numpy.convolve(w/w.sum(),s,mode='valid')
-        # use floor division operator // (new in python 3)
-        smoothed = y[(smoothwin//2):-(smoothwin//2)]
-        # smoothedl = [[e] for e in smoothed]
-        # reference suggested below to
-        # smoothed = y[(smoothwin/2-1):-(smoothwin/2)]
-
-        ## calculate the gain using the smoothed elevation profile
-        gain = elevation_gain(smoothed, upthreshold=upthreshold, downthreshold=downthreshold)
-
-        # combine gelevs with anno
-        if len(gelevs) != len(anno) or len(gelevs) != len(smoothed):
-            app.logger.debug('invalid list len len(gelevs)={} len(anno)={} len(smoothed)={}'.format(len(gelevs), len(anno), len(smoothed)))
-
-        # create csv file with calculated path points
-        # create/write path file
-        # see https://stackoverflow.com/questions/7076042/what-mime-type-should-i-use-for-csv
-        # see https://tools.ietf.org/html/rfc7111
-        path_fid, filepath = create_fidfile(g.interest, thisfile.filename+'.csv', 'text/csv')
-        with open(filepath, mode='w', newline='') as csvfile:
-            pathfields = 'lat,lng,orig_ele,res,ele,cumdist_km,inserted'.split(',')
-            pathcsv = DictWriter(csvfile, fieldnames=pathfields)
-            pathcsv.writeheader()
-
-            for ndx in range(len(gelevs)):
-                # TODO: this is probably a bit klunky from being ported from use of google sheets, clean up
-                try:
-                    ele = smoothed[ndx]
-                except IndexError:
-                    ele = None
-                try:
-                    cumdist_km = anno[ndx][0]
-                    inserted = anno[ndx][1]
-                except IndexError:
-                    cumdist_km = None
-                    inserted = None
-
-                thispoint = dict(
-                            ele = ele,
-                            cumdist_km = cumdist_km,
-                            inserted = inserted,
-                            **gelevs[ndx],
-                            )
-
-                pathcsv.writerow(thispoint)
-
-
-        return {
+
+        response = {
             'upload' : {'id': gpx_fid },
             'files' : {
                 'data' : {
@@ -400,14 +269,20 @@ class RunningRoutesFiles(CrudFiles):
                 },
             },
             'gpx_file_id' : gpx_fid,
-            'path_file_id' : path_fid,
-            # add calculated stuff to route
-            # round for user-friendly display
-            'elevation_gain' : int(round(gain)),
-            'distance' : '{:.1f}'.format(distance),
-            'start_location' : ', '.join(['{:.6f}'.format(ll) for ll in locations[0]])
         }
 
+        # calculated values are filled in by the route job worker, see jobs.py
+        # client polls the routejob endpoint for the results
+        if app.config.get('APP_ROUTE_JOBS', True):
+            job = enqueue_routejob(localinterest(), gpx_fid, thisfile.filename)
+            response['job_id'] = job.id
+
+        # process file data inline, and add calculated stuff to route
+        else:
+            response.update(process_routefile(g.interest, filepath, thisfile.filename))
+
+        return response
+
     #----------------------------------------------------------------------
     def list(self):
 
@@ -499,6 +374,29 @@ rrtable = RunningRoutesTable(app=bp,
         ])
 rrtable.register()
 
+#######################################################################
+class RunningRoutesJob(MethodView):
+    decorators = [auth_required()]
+
+    #----------------------------------------------------------------------
+    def get(self, jobid):
+        '''
+        return status of route job, with calculated values when job is done
+        '''
+        # same permissions as route table, resolved here because rrtable is shared by all requests
+        interest = get_interest(g.interest)
+        if not interest or not has_role_permission(interest, ROLE_ROUTES_ADMIN):
+            abort(403)
+
+        job = routejob_query(jobid, localinterest().id).one_or_none()
+        if not job:
+            abort(404)
+
+        return jsonify(routejob_response(job))
+
+routejob_view = RunningRoutesJob.as_view('routejob')
+bp.add_url_rule('/<interest>/routejob/<int:jobid>', view_func=routejob_view, methods=['GET',])
+
 
 #######################################################################
 class RunningRoutesTurns(MethodView):
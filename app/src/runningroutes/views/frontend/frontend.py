@@ -13,23 +13,30 @@ frontend - views for runningroutes database
 '''
 # standard
 from csv import DictReader
+from hashlib import sha1
+from math import isnan
 from urllib.parse import quote
-from os.path import join
 
 # pypi
-from flask import g, redirect, url_for, abort, render_template, jsonify, request, send_file, current_app
-from flask_security import current_user
-from loutilities.user.model import Interest, Role
-
-from runningroutes.helpers import local2common_interest, localinterest
+import numpy
+from flask import g, redirect, url_for, abort, render_template, jsonify, request, current_app
+from loutilities.user.model import Interest
 
 # home grown
 from . import bp
 from runningroutes import app
 from flask.views import MethodView
-from runningroutes.models import LocalInterest, db, Route, Files, IconMap, ROLE_SUPER_ADMIN, ROLE_ROUTES_ADMIN
-from runningroutes.files import get_fidfile
-from ...helpers import local2common_interest
+from runningroutes.models import LocalInterest, db, Route, Files, IconMap, ROLE_ROUTES_ADMIN
+from runningroutes.files import get_fidfile_mmap, iter_fidfile, send_fidfile, gpxfile_routes_query
+from runningroutes.permissions import has_role_permission
+from runningroutes.pathfile import is_pathfile, read_pathfile
+from runningroutes.simplify import lod_for_zoom, lod_for_maxpoints
+from runningroutes.polyline import encode_polyline, delta_encode
+from runningroutes.routescache import get_routes_cachefile, routes_versions
+from runningroutes.iconmapcache import iconmap_query
+from runningroutes.routequery import parse_query_args, get_queryindex, RouteQueryError
+from runningroutes.precompress import precompressed_response
+from ...helpers import local2common_interest, localid2common_interest, localinterest, get_interest
 
 debug = False
 
@@ -56,15 +63,9 @@ bp.add_url_rule('/<interest>', view_func=frontend_view, methods=['GET',])
 def check_permission(checkinterest):
     if debug: print('frontend.check_permission()')
 
-    # must be public if user not logged in
-    filters = {}
-    only_public = not current_user.is_authenticated
-    if only_public:
-        filters['public'] = True
-
     # g.interest initialized in runningroutes.create_app.pull_interest
     # g.interest contains slug, pull in interest db entry. If not found, no permission granted
-    interest = Interest.query.filter_by(interest=checkinterest, **filters).one_or_none()
+    interest = get_interest(checkinterest)
     if not interest:
         return False
 
@@ -72,23 +73,47 @@ def check_permission(checkinterest):
     if interest.public:
         return True
 
-    # not a public interest -- we need to check more deeply
+    # not a public interest -- we need to check more deeply, must be logged in
+    # roles and interests are resolved once per request, see permissions.py
+    return has_role_permission(interest, ROLE_ROUTES_ADMIN)
 
-    # is someone logged in with ROLE_SUPER_ADMIN role? They're good
-    superadmin = Role.query.filter_by(name=ROLE_SUPER_ADMIN).one()
-    if superadmin in current_user.roles:
-        return True
+# ----------------------------------------------------------------------
+def make_etag(*parts):
+    '''
+    make etag from parts which change whenever the response content changes, e.g., version_id, file id
 
-    # if they're not logged in with ROLE_ROUTES_ADMIN role, they're bad
-    routesadmin = Role.query.filter_by(name=ROLE_ROUTES_ADMIN).one()
-    if not routesadmin in current_user.roles:
-        return False
+    :param parts: hashable values
+    :return: etag string
+    '''
+    return sha1(repr(parts).encode('utf-8')).hexdigest()
 
-    # current_user has ROLE_ROUTES_ADMIN. Can this user access current interest?
-    if interest in current_user.interests:
-        return True
-    else:
-        return False
+# ----------------------------------------------------------------------
+def not_modified(etag):
+    '''
+    check request If-None-Match against etag
+
+    etags are weak because the same content may be sent with different content encoding
+
+    :param etag: etag for current content
+    :return: 304 response if client has current content, else None
+    '''
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+        return set_etag(response, etag)
+    return None
+
+# ----------------------------------------------------------------------
+def set_etag(response, etag):
+    '''
+    set etag on response, and require client to revalidate before using cached content
+
+    :param response: flask response
+    :param etag: etag for content
+    :return: response
+    '''
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    return response
 
 #######################################################################
 # view for user main runningroutes
@@ -125,7 +150,7 @@ class UserRoutes(MethodView):
             return self._retrieverows()
 
     def _renderpage(self):
-        iconmap = IconMap.query.filter_by(**self.queryparams).one_or_none()
+        iconmap = iconmap_query(self.queryparams['interest_id']).one_or_none()
         if iconmap:
             iconmapname = iconmap.page_title
         else:
@@ -141,49 +166,33 @@ class UserRoutes(MethodView):
 
 
     def _retrieverows(self):
-        routes = Route.query.filter_by(**self.queryparams).all()
-
-        # this is a bit goofy but is trying to use googles geo FeatureCollection
-        geo = {
-            'type': 'FeatureCollection',
-            'features': [],
-        }
-
-        # add points from database
-        for route in routes:
-            # skip inactive routes
-            if not route.active: continue
-
-            lat = route.latlng.split(',')[0];
-            lng = route.latlng.split(',')[1];
-
-            thisgeo = {
-                'type': 'Feature',
-                'geometry': {
-                    'type': 'Point',
-                    'coordinates': [lat, lng],
-                    'properties': {
-                                    'id': route.id,
-                                    'name': route.name,
-                                    'distance': route.distance,
-                                    'surface': route.surface,
-                                    'gain': route.elevation_gain,
-                                    'links': '', # placeholder - built on the client
-                                    'description': route.description,
-                                    'lat': lat,
-                                    'lng': lng,
-                                    'start': route.start_location,
-                                    'latlng': route.latlng,
-                                    'map': route.map,
-                                    'fileid': route.gpx_file_id,
-                    }
-                }
-            }
-            geo['features'].append(thisgeo)
-
-        # case insensitive string sort by name field
-        geo['features'].sort(key=lambda item: item['geometry']['properties']['name'].lower())
-        return jsonify(geo);
+        # FeatureCollection is prebuilt when routes are updated, see routescache.py
+        linterest = localinterest()
+        if not linterest:
+            return jsonify({'type': 'FeatureCollection', 'features': []})
+
+        # bbox, near, distance and surface filters, see routequery.py
+        try:
+            query = parse_query_args(request.args)
+        except RouteQueryError as e:
+            db.session.rollback()
+            abort(400, str(e))
+
+        versions = routes_versions(linterest.id)
+        etag = make_etag('routes', linterest.id, *versions, sorted(query.items()))
+        notmodified = not_modified(etag)
+        if notmodified:
+            return notmodified
+
+        # cache file is built from the same route versions as the etag
+        cachefile = get_routes_cachefile(linterest, versions)
+        if query:
+            features = get_queryindex(linterest.id, cachefile).select(**query)
+            response = jsonify({'type': 'FeatureCollection', 'features': features})
+        else:
+            # compressed variant is chosen based on Accept-Encoding, see precompress.py
+            response = precompressed_response(cachefile, 'application/json', etag=False, conditional=False)
+        return set_etag(response, etag)
 
 routes_view = UserRoutes.as_view('routes')
 bp.add_url_rule('/<interest>/routes', view_func=routes_view, methods=['GET',])
@@ -196,8 +205,8 @@ bp.add_url_rule('/<interest>/routes/rest', view_func=routes_view, methods=['GET'
 class UserRoute(MethodView):
 
     # ----------------------------------------------------------------------
-    def permission(self, routeid):
-        checkinterest = local2common_interest(Route.query.filter_by(id=routeid).one().interest).interest
+    def permission(self, route):
+        checkinterest = localid2common_interest(route.interest_id).interest
         return check_permission(checkinterest)
 
     # ----------------------------------------------------------------------
@@ -222,13 +231,13 @@ class UserRoute(MethodView):
             if not fileid:
                 db.session.rollback()
                 abort(403)
-            route = Route.query.filter_by(gpx_file_id=fileid).one()
+            route = gpxfile_routes_query(fileid).one()
             redirecturl = url_for('frontend.route', thisid=route.id)
             app.logger.info(
                 'legacy redirect: {} {} > {}'.format(request.method, request.full_path, redirecturl))
             return redirect(redirecturl)
 
-        if not self.permission(route.id):
+        if not self.permission(route):
             db.session.rollback()
             abort(403)
 
@@ -249,31 +258,66 @@ class UserRoute(MethodView):
     # ----------------------------------------------------------------------
     def _retrieverows(self, thisid):
         route = Route.query.filter_by(id=thisid).one()
-        routefile = get_fidfile(route.path_file_id)
 
         # verify access to group/interest is allowed, abort otherwise
-        if not self.permission(route.id):
+        if not self.permission(route):
             db.session.rollback()
             abort(403)
 
-        # process file and return data
-        route_csv = DictReader(routefile['contents'])
-
-        justpath = []
-        ftpermeter = 3.280839895
-        ele = 0
+        # zoom (map zoom level) or maxpoints may be specified to get a simplified path, see simplify.py
+        zoom = request.args.get('zoom', None, type=int)
+        maxpoints = request.args.get('maxpoints', None, type=int)
+        # format=polyline for compact response, see polyline.py
+        compact = request.args.get('format', None) == 'polyline'
 
-        for row in route_csv:
-            # row.ele is in meters -- use feet by default
-            ele = float(row['ele']) * ftpermeter
-            # if ( parameters.metric ):
-            #     ele = +row['ele'];
-            # else:
-            #     ele = +row['ele'] * ftpermeter;
+        etag = make_etag('route', route.id, route.version_id, route.path_file_id, zoom, maxpoints, compact)
+        notmodified = not_modified(etag)
+        if notmodified:
+            return notmodified
 
-            justpath.append( [row['lat'], row['lng'], float('{0:.1f}'.format(ele))] )
+        ftpermeter = 3.280839895
 
-        return jsonify({'status' : 'success', 'path':justpath})
+        # binary path file columns are read directly from the file, see pathfile.py
+        contents = get_fidfile_mmap(route.path_file_id)['contents']
+        level = 0
+        if is_pathfile(contents):
+            path = read_pathfile(contents)
+            # level of detail is precomputed for each point, version 1 files don't have it
+            if 'lod' in path and len(path['lod']) > 0:
+                if zoom is not None:
+                    level = lod_for_zoom(zoom, path['lat'][0])
+                elif maxpoints is not None:
+                    level = lod_for_maxpoints(path['lod'], maxpoints)
+            if level:
+                keep = path['lod'] >= level
+                path = {name: path[name][keep] for name in ['lat', 'lng', 'ele']}
+            lat, lng = path['lat'], path['lng']
+            # ele is in meters -- use feet by default
+            ele = numpy.round(path['ele'].astype(float) * ftpermeter, 1)
+
+        # csv path file which hasn't been converted yet
+        else:
+            route_csv = DictReader(line.decode('utf-8') for line in iter_fidfile(route.path_file_id, chunksize=None))
+
+            lat, lng, ele = [], [], []
+            for row in route_csv:
+                lat.append(float(row['lat']))
+                lng.append(float(row['lng']))
+                # row.ele is in meters -- use feet by default
+                ele.append(float('{0:.1f}'.format(float(row['ele']) * ftpermeter)))
+
+        if compact:
+            return set_etag(jsonify({'status' : 'success', 'format': 'polyline', 'lod':level,
+                                     'polyline': encode_polyline(lat, lng),
+                                     # tenths of feet
+                                     'ele': delta_encode(ele, 1), 'eleprecision': 1}), etag)
+
+        # lat, lng are sent as strings, as they were read from the csv path file
+        # unknown elevation is sent as null, since NaN isn't valid json
+        justpath = [[str(thislat), str(thislng), None if isnan(thisele) else thisele]
+                    for thislat, thislng, thisele in zip(numpy.asarray(lat).tolist(), numpy.asarray(lng).tolist(),
+                                                          numpy.asarray(ele, dtype=float).tolist())]
+        return set_etag(jsonify({'status' : 'success', 'path':justpath, 'lod':level}), etag)
 
 route_view = UserRoute.as_view('route')
 bp.add_url_rule('/route/<thisid>', view_func=route_view, methods=['GET', ])
@@ -286,8 +330,8 @@ bp.add_url_rule('/route/<thisid>/rest', view_func=route_view, methods=['GET', ])
 class UserTurns(MethodView):
 
     # ----------------------------------------------------------------------
-    def permission(self, routeid):
-        checkinterest = local2common_interest(Route.query.filter_by(id=routeid).one().interest).interest
+    def permission(self, route):
+        checkinterest = localid2common_interest(route.interest_id).interest
         return check_permission(checkinterest)
 
     # ----------------------------------------------------------------------
@@ -312,13 +356,13 @@ class UserTurns(MethodView):
             if not fileid:
                 db.session.rollback()
                 abort(403)
-            route = Route.query.filter_by(gpx_file_id=fileid).one()
+            route = gpxfile_routes_query(fileid).one()
             redirecturl = url_for('frontend.turns', thisid=route.id)
             app.logger.info(
                 'legacy redirect: {} {} > {}'.format(request.method, request.full_path, redirecturl))
             return redirect(redirecturl)
 
-        if not self.permission(route.id):
+        if not self.permission(route):
             db.session.rollback()
             abort(403)
 
@@ -341,17 +385,22 @@ class UserTurns(MethodView):
         route = Route.query.filter_by(id=thisid).one()
 
         # verify access to group/interest is allowed, abort otherwise
-        if not self.permission(route.id):
+        if not self.permission(route):
             db.session.rollback()
             abort(403)
 
+        etag = make_etag('turns', route.id, route.version_id)
+        notmodified = not_modified(etag)
+        if notmodified:
+            return notmodified
+
         # process file and return data
         if route.turns:
             justturns = route.turns.split('\n')
         else:
             justturns = []
 
-        return jsonify({'status' : 'success', 'turns':justturns})
+        return set_etag(jsonify({'status' : 'success', 'turns':justturns}), etag)
 
 turns_view = UserTurns.as_view('turns')
 bp.add_url_rule('/turns/<thisid>', view_func=turns_view, methods=['GET', ])
@@ -359,21 +408,20 @@ bp.add_url_rule('/turns/<thisid>/rest', view_func=turns_view, methods=['GET', ])
 
 class UserDownloadGpxFile(MethodView):
 
+    # ----------------------------------------------------------------------
+    def permission(self, route):
+        checkinterest = localid2common_interest(route.interest_id).interest
+        return check_permission(checkinterest)
+
+    # ----------------------------------------------------------------------
     def get(self, thisid):
         route = Route.query.filter_by(id=thisid).one()
-        gps_fid = route.gpx_file_id
-        thefile = Files.query.filter_by(fileid=gps_fid).one()
-        
-        mainfolder = current_app.config['APP_FILE_FOLDER']
-        groupfolder = join(mainfolder, local2common_interest(thefile.interest).interest)
-        filepath = join(groupfolder, gps_fid)
-
-        return send_file(
-            filepath, 
-            mimetype=thefile.mimetype, 
-            as_attachment=True, 
-            download_name=thefile.filename
-        )
+        if not self.permission(route) or not route.gpx_file_id:
+            db.session.rollback()
+            abort(403)
+
+        # when offloading is configured, nginx sends the file, see files.send_fidfile()
+        return send_fidfile(route.gpx_file_id, as_attachment=True)
 
 download_gpxfile_view = UserDownloadGpxFile.as_view('gpxdownload')
 bp.add_url_rule('/gpxdownload/<thisid>', view_func=download_gpxfile_view, methods=['GET',])
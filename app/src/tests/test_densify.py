@@ -0,0 +1,64 @@
+###########################################################################################
+# test_densify - compare numpy densifier with original scalar densifier
+#
+#       Date            Author          Reason
+#       ----            ------          ------
+#       10/18/26        Lou King        Create
+#
+#   Copyright 2026 Lou King.  All rights reserved
+###########################################################################################
+'''
+test_densify - compare numpy densifier with original scalar densifier
+
+run from app/src with python -m pytest
+'''
+# standard
+from os import environ
+
+# pypi
+import pytest
+from loutilities.geo import GeoDistance
+
+# runningroutes package needs APP_NAME at import
+environ.setdefault('APP_NAME', 'runningroutes')
+
+# homegrown
+from runningroutes.densify import get_densifier, parameterError
+
+EARTH_RADIUS = 6371.0   # km
+MAXINTERVAL = 0.010     # km
+
+# fixed paths, [lat, lng] as from loutilities.geo.LatLng.getpoints() in routepath.process_routefile()
+# the scalar engine would include ele in distances, but LatLng only returns it if getelev is set
+PATHS = {
+    'short segments': [[39.4312, -77.4154], [39.43121, -77.41541], [39.43122, -77.41539]],
+    'long segments': [[39.4312, -77.4154], [39.4400, -77.4100], [39.4350, -77.3900], [39.4312, -77.4154]],
+    'repeated point': [[39.4312, -77.4154], [39.43125, -77.41545], [39.4330, -77.4180],
+                       [39.4330, -77.4180], [39.4290, -77.4201]],
+    'north south': [[-10.0, 20.0], [-9.99, 20.0], [-9.99, 20.01]],
+    'antimeridian': [[51.5, 179.9995], [51.5, -179.9995]],
+}
+
+# ----------------------------------------------------------------------
+@pytest.mark.parametrize('name', list(PATHS))
+def test_numpy_matches_scalar(name):
+    geodist = GeoDistance(EARTH_RADIUS)
+    path = PATHS[name]
+
+    sdistance, slocs, sanno = get_densifier('scalar', geodist, MAXINTERVAL).densify(path)
+    ndistance, nlocs, nanno = get_densifier('numpy', geodist, MAXINTERVAL).densify(path)
+
+    assert ndistance == pytest.approx(sdistance, rel=1e-9, abs=1e-9)
+    assert len(nlocs) == len(slocs)
+    assert len(nanno) == len(sanno)
+    for sloc, nloc in zip(slocs, nlocs):
+        assert nloc[0] == pytest.approx(sloc[0], abs=1e-7)
+        assert nloc[1] == pytest.approx(sloc[1], abs=1e-7)
+    for (sdist, sinserted), (ndist, ninserted) in zip(sanno, nanno):
+        assert ndist == pytest.approx(sdist, rel=1e-9, abs=1e-9)
+        assert ninserted == sinserted
+
+# ----------------------------------------------------------------------
+def test_unknown_engine():
+    with pytest.raises(parameterError):
+        get_densifier('bogus', GeoDistance(EARTH_RADIUS), MAXINTERVAL)